@@ -33,7 +33,8 @@ def load_existing():
             return []
         return favs
     except Exception as e:
-        print(f"Warning: could not read {FAV_FILE}: {e}")
+        # stderr: keeps stdout clean for callers that parse it (build stages)
+        print(f"Warning: could not read {FAV_FILE}: {e}", file=sys.stderr)
         return []
 
 def save_favorites(favs):
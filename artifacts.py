@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+artifacts.py - deterministic, skip-if-unchanged writers for generated files.
+
+Every generated artifact (index JSON, categories.json, badges, caches) goes
+through write_text_if_changed():
+  - the new content is hashed and compared with the hash of the file on disk;
+    identical content is not rewritten (mtime and static-host caches survive)
+  - otherwise it is written atomically via a temp file + rename
+
+write_json_if_changed() serializes with a fixed layout and, when given a
+stamp_key (e.g. "generated_at"), keeps the timestamp already on disk if
+nothing else in the document changed. write_stream_if_changed() does the
+same for documents produced chunk by chunk (e.g. streamed from the catalog),
+which are written to the temp file as they are rendered instead of being held
+in memory.
+
+The content hash of every file that passes through these writers (written or
+not) is remembered until forget_hashes(); recorded_hash() hands it to later
+steps, such as the precache manifest, so they need not re-read the file.
+
+json/first_seen.json, the committed {source url path: first build that saw
+it} manifest, is read and updated here too (load_first_seen(),
+update_first_seen()), so generate_json.py, probe_images.py and catalog.py
+share it without importing each other.
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import json
+import re
+import time
+
+
+FIRST_SEEN_FILE = Path("json/first_seen.json")
+
+# posix path -> sha256 of the content now on disk, for files handled in this process
+_HASHES: Dict[str, str] = {}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path) -> str:
+    """
+    content_hash() of a file, read in 1 MiB chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def recorded_hash(path: Path) -> Optional[str]:
+    return _HASHES.get(path.as_posix())
+
+
+def forget_hashes() -> None:
+    """
+    Drop every recorded hash. build_all.py calls this before each in-process
+    stage, so no stage sees hashes left over from an earlier one.
+    """
+    _HASHES.clear()
+
+
+def dump_json(obj) -> str:
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """
+    Write text to path unless the file already holds identical content.
+    Returns True if the file was written.
+    """
+    data = text.encode("utf-8")
+    digest = content_hash(data)
+    _HASHES[path.as_posix()] = digest
+    try:
+        if content_hash(path.read_bytes()) == digest:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return True
+
+
+def write_json_if_changed(path: Path, obj, stamp_key: str = None) -> bool:
+    """
+    Serialize obj deterministically and write it if changed. With stamp_key,
+    obj[stamp_key] is replaced by the value on disk when the rest is equal.
+    Returns True if the file was written.
+    """
+    if stamp_key and isinstance(obj, dict) and path.exists():
+        try:
+            old = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            old = None
+        if isinstance(old, dict) and stamp_key in old:
+            rest_old = {k: v for k, v in old.items() if k != stamp_key}
+            rest_new = {k: v for k, v in obj.items() if k != stamp_key}
+            if rest_old == rest_new:
+                obj = {**obj, stamp_key: old[stamp_key]}
+    return write_text_if_changed(path, dump_json(obj))
+
+
+def write_stream_if_changed(path: Path, head: str, chunks: Iterable[str], kept_head: Optional[str] = None) -> bool:
+    """
+    Stream head + chunks into a temp file, hashing as it goes. The temp file
+    is dropped, and path left alone, when the file on disk already equals
+    head + chunks, or equals kept_head + chunks (the same document with the
+    header already on disk, e.g. an older stamp). Otherwise it replaces path.
+    Returns True if the file was written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    new = hashlib.sha256()
+    kept = hashlib.sha256() if kept_head is not None else None
+    with tmp.open("wb") as fh:
+        data = head.encode("utf-8")
+        fh.write(data)
+        new.update(data)
+        if kept is not None:
+            kept.update(kept_head.encode("utf-8"))
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            fh.write(data)
+            new.update(data)
+            if kept is not None:
+                kept.update(data)
+    try:
+        on_disk = file_hash(path)
+    except OSError:
+        on_disk = None
+    for h in (kept, new):
+        if h is not None and h.hexdigest() == on_disk:
+            tmp.unlink()
+            _HASHES[path.as_posix()] = on_disk
+            return False
+    tmp.replace(path)
+    _HASHES[path.as_posix()] = new.hexdigest()
+    return True
+
+
+def read_stamp(path: Path, stamp_key: str = "generated_at") -> Optional[str]:
+    """
+    Read a top-level string stamp from the head of a JSON file without parsing the rest.
+    """
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            head = fh.read(4096)
+    except OSError:
+        return None
+    m = re.search(r'"' + re.escape(stamp_key) + r'":\s*"([^"]*)"', head)
+    return m.group(1) if m else None
+
+
+def iso_seconds(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def load_first_seen(path: Path = FIRST_SEEN_FILE) -> Optional[Dict[str, str]]:
+    """
+    {source url path: ISO timestamp}, or None when there is no (valid) manifest yet.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def update_first_seen(tables: Dict[str, list], previous: Optional[Dict[str, str]]) -> Tuple[Dict[str, str], int]:
+    """
+    Stamp files of the scanned tables ({collection: [FileEntry]}) that the
+    manifest has not seen yet (with their mtime when there is no manifest at
+    all, otherwise with the current time) and drop removed ones.
+    Returns (manifest, number of newly stamped files).
+    """
+    now = iso_seconds(time.time())
+    out = {}
+    added = 0
+    for table in tables.values():
+        for fe in table:
+            url = Path(fe.path).as_posix()
+            stamp = previous.get(url) if previous is not None else None
+            if stamp is None:
+                stamp = now if previous is not None else iso_seconds(fe.mtime)
+                added += 1
+            out[url] = stamp
+    return dict(sorted(out.items())), added
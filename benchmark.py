@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+benchmark.py - micro-benchmarks for the build stages on synthetic trees.
+
+Usage:
+  python benchmark.py scan [--files 100000]   # scan_files.scan_collections on a synthetic tree
+  python benchmark.py probe [--files 50000]   # probe_images.probe_table on synthetic images (needs Pillow)
+  python benchmark.py startup [--files 100] [--runs 5]
+      # -X importtime of every entry point, then the wall time of a no-op
+      # build_all.py on a copy of the build scripts (needs Pillow for the first build).
+      # The no-op times are whole processes (interpreter start, imports, exit),
+      # run with sys.executable directly: launcher shims (pyenv, conda run)
+      # add their own startup on top.
+
+Each benchmark builds its fixture in a temporary directory, times the stage
+and prints one machine-parseable line:
+  BENCH_SCAN: files=N collections=C time_ms=...
+  BENCH_PROBE: files=N unknown=U time_ms=... per_file_us=...
+  BENCH_IMPORT: module=M import_ms=... pil=0|1 heaviest=name:ms,...   (one per entry point)
+  BENCH_NOOP: files=N runs=R min_ms=... median_ms=... interpreter_ms=... target_ms=100 ok=0|1 pil=0|1
+"""
+
+from pathlib import Path
+from typing import List, Tuple
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import probe_images
+import scan_files
+
+
+def build_tree(root: Path, files: int, collections: int = 2, top_dirs: int = 20, depth: int = 3) -> list:
+    """
+    Create `files` empty .jpg files spread over `collections` source roots,
+    each with `top_dirs` categories nested `depth` levels deep.
+    Returns the matching scan_files.Collection list.
+    """
+    colls = []
+    per_coll = files // collections
+    for c in range(collections):
+        src = root / f"src-{c}"
+        leaves = []
+        for t in range(top_dirs):
+            d = src / f"cat-{t:02d}"
+            for lvl in range(depth - 1):
+                d = d / f"sub-{lvl}"
+            d.mkdir(parents=True, exist_ok=True)
+            leaves.append(d)
+        for i in range(per_coll):
+            (leaves[i % len(leaves)] / f"img-{i:06d}.jpg").touch()
+        colls.append(scan_files.Collection(
+            name=f"c{c}",
+            src=src,
+            json_out=root / f"c{c}.json",
+            thumb_root=root / f"thumb-{c}",
+            max_size=(640, 360),
+        ))
+    return colls
+
+
+def bench_scan(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        colls = build_tree(Path(tmp), args.files)
+        t0 = time.perf_counter()
+        tables = scan_files.scan_collections(colls)
+        elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    found = sum(len(t) for t in tables.values())
+    print(f"BENCH_SCAN: files={found} collections={len(colls)} time_ms={elapsed_ms}")
+
+
+def build_images(root: Path, files: int) -> list:
+    """
+    Write `files` small images cycling through JPEG/PNG/WEBP/GIF and return a
+    file table for them. Encoded once with Pillow, then copied as bytes.
+    """
+    from PIL import Image
+    import io
+
+    samples = []
+    for fmt, ext, size in (("JPEG", ".jpg", (1920, 1080)), ("PNG", ".png", (1080, 1920)),
+                           ("WEBP", ".webp", (2560, 1440)), ("GIF", ".gif", (800, 600))):
+        buf = io.BytesIO()
+        Image.new("RGB", size, (40, 90, 160)).save(buf, fmt)
+        samples.append((ext, buf.getvalue()))
+
+    table = []
+    for i in range(files):
+        ext, data = samples[i % len(samples)]
+        d = root / f"cat-{i % 50:02d}"
+        d.mkdir(exist_ok=True)
+        p = d / f"img-{i:06d}{ext}"
+        p.write_bytes(data)
+        table.append(scan_files.FileEntry(f"{d.name}/{p.name}", str(p), len(data), 0.0, d.name))
+    return table
+
+
+def bench_probe(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        table = build_images(Path(tmp), args.files)
+        t0 = time.perf_counter()
+        infos = probe_images.probe_table(table)
+        elapsed = time.perf_counter() - t0
+    unknown = sum(1 for v in infos.values() if v is None)
+    per_file_us = elapsed * 1e6 / max(1, len(table))
+    print(f"BENCH_PROBE: files={len(table)} unknown={unknown} time_ms={int(elapsed * 1000)} per_file_us={per_file_us:.1f}")
+
+
+HERE = Path(__file__).parent.resolve()
+# whole-process budget for a no-op build_all.py
+NOOP_TARGET_MS = 100
+ENTRY_POINTS = ["build_all", "generate_thumbs", "generate_json", "probe_images", "make_archives", "serve"]
+
+
+def import_times(module: str, cwd: Path = HERE) -> Tuple[float, List[Tuple[str, float]], bool]:
+    """
+    Import module in a fresh interpreter with -X importtime.
+    Returns (cumulative ms of the module itself, [(top-level import, cumulative ms)], Pillow loaded).
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=str(cwd), capture_output=True, text=True, check=True)
+    total = 0.0
+    top = []
+    pil = False
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not line.startswith("import time:"):
+            continue
+        try:
+            cumulative = int(parts[1]) / 1000.0
+        except ValueError:  # header line
+            continue
+        name = parts[2].rstrip()
+        pil = pil or name.strip().split(".")[0] == "PIL"
+        if name.strip() == module:
+            total = cumulative
+        elif len(name) - len(name.lstrip()) <= 3:
+            # direct imports of the module (one level of nesting)
+            top.append((name.strip(), cumulative))
+    top.sort(key=lambda t: -t[1])
+    return total, top, pil
+
+
+def wall_ms(cmd: List[str], cwd: Path) -> Tuple[float, str]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=str(cwd), capture_output=True, text=True)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{proc.stdout}{proc.stderr}")
+    return elapsed, proc.stdout
+
+
+def bench_startup(args) -> None:
+    for module in ENTRY_POINTS:
+        total, top, pil = import_times(module)
+        heaviest = ",".join(f"{name}:{ms:.1f}" for name, ms in top[:3])
+        print(f"BENCH_IMPORT: module={module} import_ms={total:.1f} pil={int(pil)} heaviest={heaviest}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for p in HERE.glob("*.py"):
+            shutil.copy2(p, root)
+        for name in ("collections.json", "budgets.json"):
+            if (HERE / name).exists():
+                shutil.copy2(HERE / name, root)
+        colls = scan_files.load_collections(root / "collections.json")
+        per_coll = max(1, args.files // max(1, len(colls)))
+        for coll in colls:
+            (root / coll.src).mkdir(parents=True, exist_ok=True)
+            build_images(root / coll.src, per_coll)
+
+        # first build does the real work and caches the fingerprint
+        wall_ms([sys.executable, "build_all.py", "--budgets", "off"], root)
+        interpreter = min(wall_ms([sys.executable, "-c", "pass"], root)[0] for _ in range(args.runs))
+        runs = []
+        for _ in range(args.runs):
+            ms, out = wall_ms([sys.executable, "build_all.py"], root)
+            if "up to date" not in out:
+                raise RuntimeError(f"expected a no-op build, got:\n{out}")
+            runs.append(ms)
+        _, _, pil = import_times("build_all", root)
+    median = statistics.median(runs)
+    print(f"BENCH_NOOP: files={per_coll * len(colls)} runs={len(runs)} min_ms={min(runs):.0f} "
+          f"median_ms={median:.0f} interpreter_ms={interpreter:.0f} target_ms={NOOP_TARGET_MS} "
+          f"ok={int(median <= NOOP_TARGET_MS)} pil={int(pil)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark wallpaper build stages.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_scan = sub.add_parser("scan", help="Time the parallel directory scan.")
+    p_scan.add_argument("--files", type=int, default=100_000, help="Number of synthetic files (default 100000).")
+    p_scan.set_defaults(func=bench_scan)
+
+    p_probe = sub.add_parser("probe", help="Time header-only dimension probing.")
+    p_probe.add_argument("--files", type=int, default=50_000, help="Number of synthetic images (default 50000).")
+    p_probe.set_defaults(func=bench_probe)
+
+    p_startup = sub.add_parser("startup", help="Time entry point imports and a no-op build.")
+    p_startup.add_argument("--files", type=int, default=100, help="Number of synthetic images for the no-op build (default 100).")
+    p_startup.add_argument("--runs", type=int, default=5, help="No-op builds to time (default 5).")
+    p_startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,35 @@ build_all.py - run full pipeline:
 Usage:
   python build_all.py           # normal run
   python build_all.py --clean   # remove thumbnail/ and listed json files before running
+  python build_all.py --route   # first move images into the collection matching their orientation
+  python build_all.py --budgets warn   # report payload budget violations without failing
+  python build_all.py --force   # rebuild even if nothing changed
+
+Every build appends a metrics record to .cache/build_metrics.jsonl and checks
+the payload budgets in budgets.json (see build_metrics.py).
+
+The stages run in this interpreter (no extra Python start per stage) and
+heavy modules (Pillow, the metrics collector) are imported only when used.
+The source trees are scanned once per build: that scan is handed to
+generate_thumbs.py and generate_json.py and reused for the fingerprint.
+After a successful build a fingerprint of the source, thumbnail and json/
+trees, the site files and the build scripts is cached in
+.cache/build_state.json; when the next run finds the same fingerprint (and
+the last build met its budgets) it reports "up to date" without running any
+stage. --clean, --route, --force and --budgets always run the full build.
 """
 from pathlib import Path
-import subprocess
+from typing import Dict, List, NamedTuple
 import sys
 import json
 from datetime import datetime, timezone
-import html
-import shutil
-import argparse
 import time
 import re
 import os
 import unicodedata
 
+from scan_files import Collection, FileEntry, fingerprint, load_collections, scan_collections, walk_dir
+
 # Try to enable color support on Windows if colorama is present.
 try:
     import colorama
@@ -38,6 +53,8 @@ SCRIPTS = [
     ROOT / "generate_json.py",
 ]
 
+ROUTE_SCRIPT = ROOT / "probe_images.py"
+
 # Files to remove inside json/ during cleanup
 JSON_FILES_TO_REMOVE = [
     BADGE_JSON,
@@ -45,9 +62,22 @@ JSON_FILES_TO_REMOVE = [
     JSON_DIR / "wallpapers.json",
     JSON_DIR / "wallpapers-mobile.json",
     JSON_DIR / "categories.json",
+    JSON_DIR / "precache-manifest.js",
 ]
 
 THUMBNAIL_DIR = ROOT / "thumbnail"
+STATE_FILE = ROOT / ".cache" / "build_state.json"
+# Site files outside json/ whose changes affect the build (precache manifest)
+SITE_GLOBS = ["*.py", "*.json", "*.html", "css/*", "js/*"]
+SHARDS_DIR = JSON_DIR / "shards"
+# Generated directories removed during cleanup (json/first_seen.json is kept:
+# it is the committed record of when each wallpaper was added)
+GENERATED_DIRS = [
+    SHARDS_DIR,
+    JSON_DIR / "recent",
+    JSON_DIR / "archive",
+    JSON_DIR / "feeds",
+]
 
 # -------- ANSI helpers --------
 CSI = "\033["
@@ -141,15 +171,70 @@ def human_ms(ms: int) -> str:
     return f"{m}m {sec:.0f}s"
 
 
-def run_script_capture(script: Path):
+class StageResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+    error: str = ""  # "ExceptionType: message" when main() raised
+
+
+def run_stage(script: Path, args=(), **kwargs) -> StageResult:
     """
-    Run a script and return CompletedProcess (with stdout/stderr captured).
+    Run a pipeline script's main() in this interpreter, capturing its output
+    (stdout/stderr/exit code) the way a subprocess would. kwargs are passed
+    to main() (e.g. the shared source scan).
+
+    Stages keep no state in module globals between calls; the one shared
+    cache, artifacts' recorded hashes, is cleared before every stage. An
+    uncaught exception becomes exit code 1, with its traceback on stderr and
+    its summary in StageResult.error.
     """
     if not script.exists():
         raise FileNotFoundError(f"Required script not found: {script}")
-    # capture output for parsing, keep execution quiet
-    proc = subprocess.run([sys.executable, str(script)], cwd=str(ROOT), capture_output=True, text=True)
-    return proc
+    import contextlib
+    import importlib
+    import io
+    import traceback
+
+    import artifacts
+
+    artifacts.forget_hashes()
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    error = ""
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            importlib.import_module(script.stem).main(list(args), **kwargs)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                # sys.exit("message") prints the message and exits with 1
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception as e:
+            traceback.print_exc()
+            code = 1
+            error = f"{type(e).__name__}: {e}"
+    return StageResult(code, out.getvalue(), err.getvalue(), error)
+
+
+def build_fingerprint(collections: List[Collection], tables: Dict[str, List[FileEntry]]) -> str:
+    """
+    Fingerprint of everything the build reads or writes (see module docstring).
+    tables is the scan of the source trees; the thumbnail trees are walked here.
+    """
+    tables = dict(tables)
+    for coll in collections:
+        if coll.thumb_root.is_dir():
+            tables["thumbs:" + coll.name] = walk_dir(str(coll.thumb_root), "")
+    paths = []
+    for pattern in SITE_GLOBS:
+        paths.extend(sorted(ROOT.glob(pattern)))
+    for dirpath, dirnames, filenames in os.walk(JSON_DIR):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, f) for f in sorted(filenames))
+    return fingerprint(tables, paths)
 
 
 def load_json_safe(path: Path):
@@ -191,8 +276,12 @@ def compute_counts():
     return desktop_count, mobile_count, total
 
 
-def write_badge_json(desktop_count, mobile_count, total):
-    JSON_DIR.mkdir(parents=True, exist_ok=True)
+def write_badge_json(desktop_count, mobile_count, total) -> bool:
+    """
+    Returns True if badge.json was written (False: counts unchanged, file kept).
+    """
+    from artifacts import write_json_if_changed
+
     generated_at = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
     payload = {
         "generated_at": generated_at,
@@ -200,11 +289,12 @@ def write_badge_json(desktop_count, mobile_count, total):
         "mobile": mobile_count,
         "total_wallpapers": total,
     }
-    with BADGE_JSON.open("w", encoding="utf-8") as fh:
-        json.dump(payload, fh, indent=2, ensure_ascii=False)
+    return write_json_if_changed(BADGE_JSON, payload, stamp_key="generated_at")
 
 
 def generate_badge_svg(label: str, value: str, color_hex: str = "#8A2BE2"):
+    import html
+
     label_esc = html.escape(str(label))
     value_esc = html.escape(str(value))
     char_w = 6.8
@@ -239,21 +329,26 @@ def generate_badge_svg(label: str, value: str, color_hex: str = "#8A2BE2"):
     return svg
 
 
-def write_badge_svg(total):
+def write_badge_svg(total) -> bool:
+    """
+    Returns True if badge.svg was written (False: unchanged, file kept).
+    """
+    from artifacts import write_text_if_changed
+
     label = "wallpapers"
     value = str(total)
     svg = generate_badge_svg(label, value, color_hex="#8A2BE2")
-    JSON_DIR.mkdir(parents=True, exist_ok=True)
-    with BADGE_SVG.open("w", encoding="utf-8") as fh:
-        fh.write(svg)
+    return write_text_if_changed(BADGE_SVG, svg)
 
 
 # ---------- cleaning ----------
 def clean_outputs():
     """
-    Remove thumbnail directory (recursively) and specified JSON files inside json/.
+    Remove thumbnail directory (recursively), the generated json/ subdirectories and specified JSON files inside json/.
     Returns dict describing what happened.
     """
+    import shutil
+
     removed = {"thumbnail_removed": False, "files_removed": []}
 
     if THUMBNAIL_DIR.exists():
@@ -264,6 +359,11 @@ def clean_outputs():
             THUMBNAIL_DIR.unlink()
             removed["thumbnail_removed"] = True
 
+    for d in GENERATED_DIRS:
+        if d.is_dir():
+            shutil.rmtree(d)
+            removed["files_removed"].append(str(d) + "/")
+
     for p in JSON_FILES_TO_REMOVE:
         if p.exists():
             p.unlink()
@@ -368,15 +468,45 @@ def boxed_print(title: str, lines: list):
 
 
 # ---------- main ----------
+def print_header():
+    header = f"Wallpaper Build Pipeline — {datetime.now().astimezone().isoformat()}"
+    print(bold(magenta(header)))
+
+
 def main(argv=None):
+    overall_t0 = time.perf_counter()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    os.chdir(ROOT)
+
+    collections = load_collections()
+    tables = None
+
+    # no-op fast path: nothing the build depends on changed since the last
+    # success, and that build met its budgets. Every option (--clean, --route,
+    # --force, --budgets) asks for a full build, so the check only runs for a
+    # plain invocation and before the argument parser is even set up.
+    if not argv:
+        # sequential scan: no thread pool has to start when nothing changed
+        tables = scan_collections(collections, max_workers=1)
+        state = load_json_safe(STATE_FILE) or {}
+        if (state.get("fingerprint") and not state.get("budget_violations")
+                and state["fingerprint"] == build_fingerprint(collections, tables)):
+            print_header()
+            total_time_ms = int((time.perf_counter() - overall_t0) * 1000)
+            print(green(f"✔ Build up to date - nothing changed since the last build "
+                        f"(total_wallpapers={state.get('total_wallpapers', 0)} time={human_ms(total_time_ms)}; --force to rebuild)"))
+            return
+
+    import argparse
+
     parser = argparse.ArgumentParser(description="Run wallpaper build pipeline.")
     parser.add_argument("--clean", action="store_true", help="Delete thumbnail/ and listed json files before running.")
+    parser.add_argument("--route", action="store_true", help="Move images whose aspect ratio does not match their collection before building.")
+    parser.add_argument("--budgets", choices=["fail", "warn", "off"], default=None,
+                        help="What to do when a payload budget is exceeded (default: on_violation in budgets.json).")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if nothing changed since the last build.")
     args = parser.parse_args(argv)
-
-    overall_t0 = time.perf_counter()
-
-    header = f"Wallpaper Build Pipeline — {datetime.now().astimezone().isoformat()}"
-    print(bold(magenta(header)))
+    print_header()
 
     if args.clean:
         removed = clean_outputs()
@@ -394,17 +524,26 @@ def main(argv=None):
     # run scripts
     summaries = {}
     script_times = {}
-    for script in SCRIPTS:
+    steps = [(script, ()) for script in SCRIPTS]
+    if args.route:
+        steps.insert(0, (ROUTE_SCRIPT, ("--route",)))
+    for script, script_args in steps:
         name = script.name
+        stage_kwargs = {}
+        if script in SCRIPTS:
+            # one scan shared by the stages, taken after routing (which moves files)
+            if tables is None:
+                tables = scan_collections(collections)
+            stage_kwargs["tables"] = tables
         print(f"{blue('🡒')} Running {bold(name)} ...", flush=True)
         t0 = time.perf_counter()
-        proc = run_script_capture(script)
+        proc = run_stage(script, script_args, **stage_kwargs)
         dt_ms = int((time.perf_counter() - t0) * 1000)
         script_times[name] = dt_ms
 
         if proc.returncode != 0:
             error_lines = [
-                f"{name} failed with exit code {proc.returncode}",
+                f"{name} raised {proc.error}" if proc.error else f"{name} failed with exit code {proc.returncode}",
             ]
             if proc.stdout:
                 error_lines.append("STDOUT:")
@@ -425,6 +564,8 @@ def main(argv=None):
                     summaries["thumbs_human"] = m.group(0)
         elif name == "generate_json.py":
             summaries["json"] = parse_summary_line(proc.stdout, "JSON_SUMMARY:")
+        elif name == "probe_images.py":
+            summaries["probe"] = parse_summary_line(proc.stdout, "PROBE_SUMMARY:")
 
     # recompute thumbnail counts after
     thumbs_after = count_thumbs(THUMBNAIL_DIR)
@@ -433,8 +574,21 @@ def main(argv=None):
     # compute JSON counts
     dcount, mcount, total_count = compute_counts()
 
+    # write badges (before summarizing, so skipped writes can be reported)
+    badge_writes = [write_badge_json(dcount, mcount, total_count), write_badge_svg(total_count)]
+    badges_written = sum(1 for w in badge_writes if w)
+    js = summaries.get("json") or {}
+    artifacts_written = badges_written + int(js.get("written", 0) or 0)
+    artifacts_unchanged = (len(badge_writes) - badges_written) + int(js.get("unchanged", 0) or 0)
+
     # Build summary lines with colors and icons
-    lines = [
+    lines = []
+    if "probe" in summaries and summaries["probe"]:
+        ps = summaries["probe"]
+        lines.append(green("⇄ Routing:"))
+        lines.append(f"  Probed: {ps.get('probed', 0)} | Misrouted: {yellow(str(ps.get('misrouted', 0)))} | Moved: {green(str(ps.get('moved', 0)))}")
+        lines.append("")
+    lines += [
         green("🖼 Thumbnails:"),
         f"  Before: {thumbs_before} | After: {thumbs_after} | Added: {green(str(thumbs_after - thumbs_before))}",
     ]
@@ -444,8 +598,9 @@ def main(argv=None):
         up_to_date = ts.get("up_to_date", 0)
         skipped_gif = ts.get("skipped_gif", 0)
         failed = ts.get("failed", 0)
+        quarantined = ts.get("quarantined", 0)
         time_ms = ts.get("time_ms", script_times.get("generate_thumbs.py", 0))
-        lines.append(f"  Created: {green(str(created))} | Up-to-date: {yellow(str(up_to_date))} | Skipped GIF: {faint(str(skipped_gif))} | Failed: {red(str(failed))}")
+        lines.append(f"  Created: {green(str(created))} | Up-to-date: {yellow(str(up_to_date))} | Skipped GIF: {faint(str(skipped_gif))} | Failed: {red(str(failed))} | Quarantined: {faint(str(quarantined))}")
         lines.append(f"  Time: {human_ms(time_ms)}")
     else:
         lines.append(f"  Time: {human_ms(script_times.get('generate_thumbs.py', 0))}")
@@ -459,6 +614,10 @@ def main(argv=None):
         jt = js.get("total", total_count)
         jtime = js.get("time_ms", script_times.get("generate_json.py", 0))
         lines.append(f"  Desktop: {green(str(jd))} | Mobile: {green(str(jm))} | Total: {bold(green(str(jt)))}")
+        if js.get("added"):
+            lines.append(f"  New since last build: {green(str(js['added']))} (json/recent/, json/archive/, json/feeds/)")
+        if js.get("misrouted"):
+            lines.append(f"  {yellow('Misrouted:')} {js['misrouted']} (run probe_images.py to list, --route to fix)")
         lines.append(f"  Time: {human_ms(jtime)}")
     else:
         lines.append(f"  Desktop: {green(str(dcount))} | Mobile: {green(str(mcount))} | Total: {bold(green(str(total_count)))}")
@@ -466,7 +625,12 @@ def main(argv=None):
 
     lines.append("")
     lines.append(green("𝒊 Badges:"))
-    lines.append(f"  badge.json and badge.svg written | Total Wallpapers: {bold(str(total_count))}")
+    badge_state = "written" if badges_written else "unchanged"
+    lines.append(f"  badge.json and badge.svg {badge_state} | Total Wallpapers: {bold(str(total_count))}")
+
+    lines.append("")
+    lines.append(green("Artifacts:"))
+    lines.append(f"  Written: {green(str(artifacts_written))} | Unchanged (skipped): {faint(str(artifacts_unchanged))}")
 
     lines.append("")
     lines.append(green("Timings:"))
@@ -474,15 +638,63 @@ def main(argv=None):
         lines.append(f"  • {n}: {human_ms(ms)}")
     lines.append(f"  • Total build time: {bold(human_ms(total_time_ms))}")
 
+    # metrics history and payload budgets
+    import build_metrics
+
+    budgets = build_metrics.load_budgets()
+    budget_mode = args.budgets or budgets.get("on_violation", "fail")
+    record = build_metrics.collect(script_times, total_time_ms, summaries)
+    flat = build_metrics.flat_metrics(record)
+    history = build_metrics.load_history()
+    violations, missed = [], []
+    if budget_mode != "off":
+        violations = build_metrics.check_budgets(flat, budgets.get("budgets", {}))
+        missed = build_metrics.check_budgets(flat, budgets.get("targets", {}))
+    regressions = []
+    if history:
+        regressions = build_metrics.find_regressions(flat, build_metrics.flat_metrics(history[-1]),
+                                                     budgets.get("regression_warn_pct", 10))
+    record["budget_violations"] = [m for m, _, _ in violations]
+    build_metrics.append_history(record)
+
+    lines.append("")
+    lines.append(green("Budgets:"))
+    th = record["thumbnails"]
+    lines.append(f"  Thumbnails p95: {th['p95_bytes'] // 1024} KB | max: {th['max_bytes'] // 1024} KB | "
+                 f"total: {th['total_bytes'] // 1024} KB")
+    if budget_mode == "off":
+        lines.append(f"  {faint('Budget checks disabled')}")
+    elif not violations:
+        lines.append(f"  {green('✔')} {len(budgets.get('budgets', {}))} budgets met")
+    for metric, value, limit in violations:
+        lines.append(f"  {red('✖') if budget_mode == 'fail' else yellow('✖')} {metric}: {value} > {limit}")
+    for metric, value, limit in missed:
+        lines.append(f"  {yellow('!')} {metric}: {value} > target {limit}")
+    for metric, old, value in regressions:
+        lines.append(f"  {yellow('▲')} {metric}: {old} -> {value} since last build")
+
+    if violations and budget_mode == "fail":
+        boxed_print(red("✖ BUDGET EXCEEDED"), lines)
+        print(red(f"✖ Build failed - {len(violations)} payload budget(s) exceeded (see budgets.json, or --budgets warn)"))
+        sys.exit(1)
+
     # nice success box
     boxed_print(green("BUILD SUCCESS ✔"), lines)
 
-    # final one-line GO/NO-GO for CI readability
-    print(green(f"✔ Build succeeded - total_wallpapers={total_count} thumbnails_added={thumbs_after - thumbs_before} time={human_ms(total_time_ms)}"))
+    # remember the finished state for the no-op fast path
+    from artifacts import write_json_if_changed
 
-    # write badges (perform after summarizing)
-    write_badge_json(dcount, mcount, total_count)
-    write_badge_svg(total_count)
+    write_json_if_changed(STATE_FILE, {
+        "fingerprint": build_fingerprint(collections, tables),
+        "budget_violations": len(violations),
+        "total_wallpapers": total_count,
+        "desktop": dcount,
+        "mobile": mcount,
+    })
+
+    # final one-line GO/NO-GO for CI readability
+    print(green(f"✔ Build succeeded - total_wallpapers={total_count} thumbnails_added={thumbs_after - thumbs_before} "
+                f"artifacts_written={artifacts_written} artifacts_unchanged={artifacts_unchanged} time={human_ms(total_time_ms)}"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+build_metrics.py - per-build metrics history and payload budgets.
+
+build_all.py calls collect() after every build and appends the record to a
+rolling history (.cache/build_metrics.jsonl, last HISTORY_LIMIT builds):
+
+  stages        wall time per pipeline script (ms)
+  artifacts     raw and gzip bytes of every collection's index JSON, categories and badges
+  outputs       file count and bytes of each generated json/ subdirectory
+  thumbnails    count/bytes per collection and category, plus p50/p95/max
+  sources       count/bytes per collection and category (from the catalog)
+  cache         hit rates: thumbnails up to date, catalog rows reused,
+                JSON artifacts left unchanged
+  peak_rss_kb   largest resident set of the build process (stages run in-process)
+
+Every record is flattened into named metrics (flat_metrics()), e.g.
+"gzip_bytes:json/wallpapers.json" or "thumb_p95_bytes". budgets.json maps
+metric names to upper limits:
+
+  {
+    "on_violation": "fail",          # or "warn"
+    "regression_warn_pct": 10,       # warn when a size metric grows more than this
+    "budgets": {"gzip_bytes:json/wallpapers.json": 30720},   # hard limits
+    "targets": {"thumb_p95_bytes": 61440}                    # goals: always only warn
+  }
+
+Without budgets.json, DEFAULT_BUDGETS apply.
+
+Usage:
+  python build_metrics.py              # print the key metrics of the last builds
+  python build_metrics.py --last 20
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import argparse
+import gzip
+import json
+import subprocess
+import sys
+
+from scan_files import load_collections, walk_dir
+import catalog
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_HISTORY = Path(".cache/build_metrics.jsonl")
+BUDGETS_FILE = Path("budgets.json")
+HISTORY_LIMIT = 200
+
+JSON_DIR = Path("json")
+# Measured besides every collection's index JSON (see artifact_paths)
+SITE_ARTIFACTS = [
+    JSON_DIR / "categories.json",
+    JSON_DIR / "badge.json",
+    JSON_DIR / "badge.svg",
+]
+OUTPUT_DIRS = [JSON_DIR / "shards", JSON_DIR / "recent", JSON_DIR / "archive", JSON_DIR / "feeds"]
+
+DEFAULT_BUDGETS = {
+    "on_violation": "fail",
+    "regression_warn_pct": 10,
+    "budgets": {
+        "gzip_bytes:json/wallpapers.json": 30 * 1024,
+        "gzip_bytes:json/wallpapers-mobile.json": 30 * 1024,
+    },
+    "targets": {
+        "thumb_p95_bytes": 60 * 1024,
+    },
+}
+
+# Flat metrics checked for growth against the previous build (sizes are
+# deterministic; timings are too noisy to warn on)
+REGRESSION_PREFIXES = ("gzip_bytes:", "thumb_p95_bytes", "thumb_total_bytes", "outputs_bytes:")
+
+
+def gzip_size(data: bytes) -> int:
+    return len(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def artifact_paths(collections) -> List[Path]:
+    """
+    The index JSON of every collection in collections.json, then SITE_ARTIFACTS.
+    """
+    return [coll.json_out for coll in collections] + SITE_ARTIFACTS
+
+
+def artifact_sizes(paths: List[Path]) -> Dict[str, dict]:
+    out = {}
+    for p in paths:
+        try:
+            data = p.read_bytes()
+        except OSError:
+            continue
+        out[p.as_posix()] = {"bytes": len(data), "gzip_bytes": gzip_size(data)}
+    return out
+
+
+def dir_sizes(paths: List[Path]) -> Dict[str, dict]:
+    out = {}
+    for d in paths:
+        if not d.is_dir():
+            continue
+        files = [p.stat().st_size for p in d.rglob("*") if p.is_file()]
+        out[d.as_posix()] = {"files": len(files), "bytes": sum(files)}
+    return out
+
+
+def percentile(sorted_values: List[int], pct: float) -> int:
+    """
+    Nearest-rank percentile of an ascending list (0 when empty).
+    """
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def thumbnail_stats(collections) -> dict:
+    per_coll = {}
+    sizes = []
+    for coll in collections:
+        cats = {}
+        if coll.thumb_root.is_dir():
+            for fe in walk_dir(str(coll.thumb_root), ""):
+                c = cats.setdefault(fe.category, {"count": 0, "bytes": 0})
+                c["count"] += 1
+                c["bytes"] += fe.size
+                sizes.append(fe.size)
+        per_coll[coll.name] = cats
+    sizes.sort()
+    return {
+        "collections": per_coll,
+        "count": len(sizes),
+        "total_bytes": sum(sizes),
+        "p50_bytes": percentile(sizes, 50),
+        "p95_bytes": percentile(sizes, 95),
+        "max_bytes": sizes[-1] if sizes else 0,
+    }
+
+
+def source_stats(collections) -> dict:
+    conn = catalog.connect()
+    try:
+        out = {}
+        for coll in collections:
+            out[coll.name] = {
+                cat: {"count": n, "bytes": b}
+                for cat, n, b in catalog.category_bytes(conn, coll.name)
+            }
+        return out
+    finally:
+        conn.close()
+
+
+def _rate(hits: int, total: int) -> Optional[float]:
+    return round(hits / total, 4) if total else None
+
+
+def cache_rates(summaries: Dict[str, dict]) -> dict:
+    ts = summaries.get("thumbs") or {}
+    js = summaries.get("json") or {}
+    thumbs_hit = int(ts.get("up_to_date", 0) or 0)
+    thumbs_total = thumbs_hit + int(ts.get("created", 0) or 0) + int(ts.get("failed", 0) or 0)
+    rows = int(js.get("total", 0) or 0)
+    changed = int(js.get("changed", 0) or 0)
+    unchanged = int(js.get("unchanged", 0) or 0) + int(js.get("skipped", 0) or 0)
+    return {
+        "thumbs_up_to_date": _rate(thumbs_hit, thumbs_total),
+        "catalog_rows_reused": _rate(max(rows - changed, 0), rows),
+        "json_unchanged": _rate(unchanged, unchanged + int(js.get("written", 0) or 0)),
+    }
+
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux but in bytes on macOS
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+def git_commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip() or None
+
+
+def collect(stage_times: Dict[str, int], total_time_ms: int, summaries: Dict[str, dict]) -> dict:
+    """
+    Build one metrics record for the build that just finished.
+    """
+    collections = load_collections()
+    ts = summaries.get("thumbs") or {}
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "total_time_ms": total_time_ms,
+        "stages": dict(stage_times),
+        "artifacts": artifact_sizes(artifact_paths(collections)),
+        "outputs": dir_sizes(OUTPUT_DIRS),
+        "thumbnails": thumbnail_stats(collections),
+        "sources": source_stats(collections),
+        "failures": {"thumbs_failed": int(ts.get("failed", 0) or 0),
+                     "thumbs_quarantined": int(ts.get("quarantined", 0) or 0)},
+        "cache": cache_rates(summaries),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def flat_metrics(record: dict) -> Dict[str, float]:
+    """
+    Named scalar metrics of a record (the keys budgets.json refers to).
+    """
+    out = {"total_time_ms": record.get("total_time_ms", 0)}
+    for name, ms in record.get("stages", {}).items():
+        out[f"stage_ms:{name}"] = ms
+    for path, sz in record.get("artifacts", {}).items():
+        out[f"bytes:{path}"] = sz["bytes"]
+        out[f"gzip_bytes:{path}"] = sz["gzip_bytes"]
+    for path, sz in record.get("outputs", {}).items():
+        out[f"outputs_bytes:{path}"] = sz["bytes"]
+    th = record.get("thumbnails", {})
+    for key in ("count", "total_bytes", "p50_bytes", "p95_bytes", "max_bytes"):
+        if key in th:
+            out[f"thumb_{key}"] = th[key]
+    out["source_total_bytes"] = sum(
+        c["bytes"] for cats in record.get("sources", {}).values() for c in cats.values()
+    )
+    for key, n in record.get("failures", {}).items():
+        out[key] = n
+    if record.get("peak_rss_kb") is not None:
+        out["peak_rss_kb"] = record["peak_rss_kb"]
+    return out
+
+
+def load_budgets(path: Path = BUDGETS_FILE) -> dict:
+    if not path.exists():
+        return DEFAULT_BUDGETS
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {**DEFAULT_BUDGETS, **data}
+
+
+def check_budgets(flat: Dict[str, float], limits: Dict[str, float]) -> List[Tuple[str, float, float]]:
+    """
+    (metric, value, limit) for every limit exceeded. Metrics the build did not
+    produce are skipped.
+    """
+    out = []
+    for metric, limit in limits.items():
+        value = flat.get(metric)
+        if value is not None and value > limit:
+            out.append((metric, value, limit))
+    return out
+
+
+def find_regressions(flat: Dict[str, float], previous: Dict[str, float], pct: float) -> List[Tuple[str, float, float]]:
+    """
+    (metric, previous value, value) for size metrics that grew more than pct percent.
+    """
+    out = []
+    for metric, value in flat.items():
+        if not metric.startswith(REGRESSION_PREFIXES):
+            continue
+        old = previous.get(metric)
+        if old and value > old * (1 + pct / 100.0):
+            out.append((metric, old, value))
+    return out
+
+
+def load_history(path: Path = METRICS_HISTORY) -> List[dict]:
+    if not path.exists():
+        return []
+    out = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            continue
+    return out
+
+
+def append_history(record: dict, path: Path = METRICS_HISTORY, limit: int = HISTORY_LIMIT) -> None:
+    history = load_history(path)[-(limit - 1):] + [record]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("".join(json.dumps(r, ensure_ascii=False, sort_keys=True) + "\n" for r in history), encoding="utf-8")
+    tmp.replace(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show recent build metrics.")
+    parser.add_argument("--last", type=int, default=10, help="Number of builds to show (default 10).")
+    args = parser.parse_args(argv)
+
+    history = load_history()[-args.last:]
+    if not history:
+        print(f"No build metrics yet ({METRICS_HISTORY} is written by build_all.py).")
+        return
+    cols = ["total_time_ms", "gzip_bytes:json/wallpapers.json", "gzip_bytes:json/wallpapers-mobile.json",
+            "thumb_p95_bytes", "thumb_total_bytes", "peak_rss_kb"]
+    print("generated_at               commit   " + "  ".join(c.split(":")[-1] for c in cols))
+    for rec in history:
+        flat = flat_metrics(rec)
+        vals = "  ".join(str(flat.get(c, "-")) for c in cols)
+        print(f"{rec.get('generated_at', '')[:25]:<26} {rec.get('commit') or '-':<8} {vals}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+catalog.py - local SQLite catalog of every wallpaper (.cache/catalog.sqlite3).
+
+Tables:
+  files       one row per image: collection, rel, path, category, size,
+              sha256 of the content, mtime (of that content; exported as
+              "modified"), scan_mtime (seen by the last scan),
+              format/width/height (from probe_images), sort_key, first_seen
+              (from json/first_seen.json) and whether its thumbnail exists
+  files_fts   FTS5 index over filename and category (kept in sync by triggers)
+  dirty       (collection, category, month) groups touched since the last
+              export of the recent/archive slices (see generate_json.py)
+  failures    thumbnail negative cache (see generate_thumbs.py)
+  hashes      content hash per site file, keyed by (size, mtime_ns), so the
+              precache manifest (precache.py) only reads new or changed files
+
+The catalog runs in WAL mode and is maintained incrementally: sync() compares
+a fresh scan with the stored (size, scan_mtime, path, first_seen, has_thumb)
+per file. A file whose size and path are unchanged but whose mtime moved is
+hashed: identical content only refreshes scan_mtime (a touch, a fresh
+checkout). New files and files whose content changed are hashed, probed and
+upserted; rows of files that disappeared are deleted. Every group with a new,
+changed or deleted file is recorded in the dirty table.
+generate_json.py exports the index JSON, shards and category counts from it
+with streaming, indexed queries.
+
+The catalog is a cache derived from the source trees: deleting it is safe,
+and a schema change simply rebuilds it.
+
+Usage:
+  python catalog.py stats
+  python catalog.py search "cyber city" [--collection desktop] [--limit 20]
+"""
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import sqlite3
+
+from artifacts import file_hash, iso_seconds, load_first_seen
+from probe_images import ImageInfo, probe_table
+from scan_files import RASTER_EXTS, Collection, FileEntry, load_collections, scan_collections
+
+CATALOG_DB = Path(".cache/catalog.sqlite3")
+SCHEMA_VERSION = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id         INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    rel        TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    filename   TEXT NOT NULL,
+    category   TEXT NOT NULL,
+    sort_key   TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    sha256     TEXT NOT NULL,
+    mtime      REAL NOT NULL,
+    scan_mtime REAL NOT NULL,
+    format     TEXT,
+    width      INTEGER,
+    height     INTEGER,
+    first_seen TEXT NOT NULL,
+    has_thumb  INTEGER NOT NULL,
+    UNIQUE (collection, rel)
+);
+CREATE INDEX IF NOT EXISTS files_by_order ON files (collection, sort_key, rel);
+CREATE INDEX IF NOT EXISTS files_by_category ON files (collection, category, sort_key, rel);
+CREATE INDEX IF NOT EXISTS files_by_first_seen ON files (collection, first_seen);
+CREATE INDEX IF NOT EXISTS files_by_category_first_seen ON files (collection, category, first_seen);
+
+CREATE TABLE IF NOT EXISTS dirty (
+    collection TEXT NOT NULL,
+    category   TEXT NOT NULL,
+    month      TEXT NOT NULL,
+    PRIMARY KEY (collection, category, month)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5 (
+    filename, category, content='files', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, filename, category) VALUES (new.id, new.filename, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, filename, category) VALUES ('delete', old.id, old.filename, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF filename, category ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, filename, category) VALUES ('delete', old.id, old.filename, old.category);
+    INSERT INTO files_fts (rowid, filename, category) VALUES (new.id, new.filename, new.category);
+END;
+
+CREATE TABLE IF NOT EXISTS failures (
+    path      TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mtime     REAL NOT NULL,
+    error     TEXT NOT NULL,
+    message   TEXT NOT NULL,
+    stage     TEXT NOT NULL,
+    failed_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS hashes (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256   TEXT NOT NULL
+);
+"""
+
+_DROP = """
+DROP TABLE IF EXISTS hashes;
+DROP TABLE IF EXISTS dirty;
+DROP TABLE IF EXISTS files_fts;
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS failures;
+DROP TABLE IF EXISTS favorites;  -- dropped from the schema in version 5
+"""
+
+# Columns exported per file, in this order (see row_to_entry)
+ENTRY_COLUMNS = "rel, path, size, mtime, category, format, width, height, first_seen, has_thumb"
+
+
+def connect(path: Path = CATALOG_DB) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript(_DROP)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def sort_key(rel: str) -> str:
+    """
+    Key that orders a collection like scan_files does: inside every directory,
+    files first, then subdirectories, each case-insensitively.
+    """
+    parts = rel.split("/")
+    return "\0".join(["1" + p.lower() for p in parts[:-1]] + ["0" + parts[-1].lower()])
+
+
+def row_to_entry(row: tuple) -> Tuple[FileEntry, Optional[ImageInfo], str, bool]:
+    """
+    Split an ENTRY_COLUMNS row into (FileEntry, ImageInfo or None, first_seen, has_thumb).
+    """
+    rel, path, size, mtime, category, fmt, width, height, first_seen, has_thumb = row
+    info = ImageInfo(fmt or "", width, height) if width and height else None
+    return FileEntry(rel, path, size, mtime, category), info, first_seen, bool(has_thumb)
+
+
+def thumb_path(coll: Collection, rel: str) -> Optional[Path]:
+    """
+    Thumbnail location for rel, or None for files that never get one (GIF/SVG).
+    """
+    rel_path = Path(rel)
+    if rel_path.suffix.lower() not in RASTER_EXTS:
+        return None
+    return coll.thumb_root.joinpath(rel_path.with_suffix(".webp"))
+
+
+# ---------- maintenance ----------
+def file_digests(paths: List[str], max_workers: int = 8) -> Dict[str, str]:
+    """
+    {path: sha256 of its content}, hashed in parallel for larger batches.
+    """
+    if len(paths) < 16:
+        return {p: file_hash(p) for p in paths}
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(file_hash, paths)))
+
+
+def sync(conn: sqlite3.Connection, collections: List[Collection], tables: Dict[str, List[FileEntry]],
+         first_seen: Dict[str, str] = None) -> Dict[str, int]:
+    """
+    Bring the files table in line with a fresh scan. Only new or changed files
+    are probed and written; files whose mtime moved but whose content hash is
+    unchanged are only "touched" (no probe, no dirty group). first_seen maps
+    POSIX source paths to timestamps (files missing from it fall back to their mtime).
+    Returns {"inserted", "updated", "deleted", "touched"}.
+    """
+    first_seen = first_seen or {}
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "touched": 0}
+    with conn:
+        names = [c.name for c in collections]
+        cur = conn.execute(
+            f"DELETE FROM files WHERE collection NOT IN ({','.join('?' * len(names))})", names
+        )
+        stats["deleted"] += cur.rowcount
+
+        for coll in collections:
+            existing = {
+                row[1]: row
+                for row in conn.execute(
+                    "SELECT id, rel, size, scan_mtime, path, category, first_seen, has_thumb, sha256 "
+                    "FROM files WHERE collection = ?",
+                    (coll.name,),
+                )
+            }
+            dirty = set()
+            new = []  # (FileEntry, first_seen, has_thumb, old row or None): hash, then compare
+            restamped = []  # (first_seen, has_thumb, id): only these two columns changed
+            for fe in tables.get(coll.name, []):
+                fs = first_seen.get(Path(fe.path).as_posix()) or iso_seconds(fe.mtime)
+                tp = thumb_path(coll, fe.rel)
+                ht = 1 if tp is not None and tp.exists() else 0
+                old = existing.pop(fe.rel, None)
+                if old is None or (old[2], old[3], old[4]) != (fe.size, fe.mtime, fe.path):
+                    new.append((fe, fs, ht, old))
+                elif (old[6], old[7]) != (fs, ht):
+                    restamped.append((fs, ht, old[0]))
+                    stats["updated"] += 1
+                    dirty.update({(fe.category, old[6][:7]), (fe.category, fs[:7])})
+
+            digests = file_digests([fe.path for fe, _, _, _ in new])
+            changed = []  # (FileEntry, sha256, first_seen, has_thumb): full upsert, needs probing
+            touched = []  # (scan_mtime, id): same content, new mtime
+            for fe, fs, ht, old in new:
+                digest = digests[fe.path]
+                if old is None:
+                    stats["inserted"] += 1
+                elif (old[2], old[4], old[8]) == (fe.size, fe.path, digest):
+                    touched.append((fe.mtime, old[0]))
+                    stats["touched"] += 1
+                    if (old[6], old[7]) != (fs, ht):
+                        restamped.append((fs, ht, old[0]))
+                        stats["updated"] += 1
+                        dirty.update({(fe.category, old[6][:7]), (fe.category, fs[:7])})
+                    continue
+                else:
+                    stats["updated"] += 1
+                    dirty.add((fe.category, old[6][:7]))
+                changed.append((fe, digest, fs, ht))
+                dirty.add((fe.category, fs[:7]))
+
+            infos = probe_table([fe for fe, _, _, _ in changed])
+            conn.executemany(
+                """
+                INSERT INTO files (collection, rel, path, filename, category, sort_key, size, sha256,
+                                   mtime, scan_mtime, format, width, height, first_seen, has_thumb)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (collection, rel) DO UPDATE SET
+                    path = excluded.path, size = excluded.size, sha256 = excluded.sha256,
+                    mtime = excluded.mtime, scan_mtime = excluded.scan_mtime,
+                    format = excluded.format, width = excluded.width, height = excluded.height,
+                    first_seen = excluded.first_seen, has_thumb = excluded.has_thumb
+                """,
+                (
+                    (coll.name, fe.rel, fe.path, fe.rel.rsplit("/", 1)[-1], fe.category, sort_key(fe.rel),
+                     fe.size, digest, fe.mtime, fe.mtime, *_info_cols(infos.get(fe.path)), fs, ht)
+                    for fe, digest, fs, ht in changed
+                ),
+            )
+            conn.executemany("UPDATE files SET scan_mtime = ? WHERE id = ?", touched)
+            conn.executemany("UPDATE files SET first_seen = ?, has_thumb = ? WHERE id = ?", restamped)
+            conn.executemany("DELETE FROM files WHERE id = ?", ((row[0],) for row in existing.values()))
+            stats["deleted"] += len(existing)
+            dirty.update((row[5], row[6][:7]) for row in existing.values())
+            conn.executemany(
+                "INSERT OR IGNORE INTO dirty (collection, category, month) VALUES (?, ?, ?)",
+                ((coll.name, cat, month) for cat, month in dirty),
+            )
+    return stats
+
+
+def _info_cols(info: Optional[ImageInfo]) -> tuple:
+    return (info.format, info.width, info.height) if info else (None, None, None)
+
+
+def load_failures(conn: sqlite3.Connection) -> Dict[str, dict]:
+    out = {}
+    for path, size, mtime, error, message, stage, failed_at in conn.execute(
+        "SELECT path, size, mtime, error, message, stage, failed_at FROM failures ORDER BY path"
+    ):
+        out[path] = {"size": size, "mtime": mtime, "error": error, "message": message,
+                     "stage": stage, "failed_at": failed_at}
+    return out
+
+
+def save_failures(conn: sqlite3.Connection, bad: Dict[str, dict]) -> None:
+    with conn:
+        conn.execute("DELETE FROM failures")
+        conn.executemany(
+            "INSERT INTO failures (path, size, mtime, error, message, stage, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((p, r["size"], r["mtime"], r["error"], r["message"], r["stage"], r["failed_at"]) for p, r in bad.items()),
+        )
+
+
+def load_hashes(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int, str]]:
+    return {path: (size, mtime_ns, digest)
+            for path, size, mtime_ns, digest in conn.execute("SELECT path, size, mtime_ns, sha256 FROM hashes")}
+
+
+def save_hashes(conn: sqlite3.Connection, hashes: Dict[str, Tuple[int, int, str]]) -> None:
+    with conn:
+        conn.execute("DELETE FROM hashes")
+        conn.executemany(
+            "INSERT INTO hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            ((p, size, mtime_ns, digest) for p, (size, mtime_ns, digest) in hashes.items()),
+        )
+
+
+# ---------- queries ----------
+def count(conn: sqlite3.Connection, collection: str, category: str = None) -> int:
+    if category is None:
+        return conn.execute("SELECT COUNT(*) FROM files WHERE collection = ?", (collection,)).fetchone()[0]
+    return conn.execute(
+        "SELECT COUNT(*) FROM files WHERE collection = ? AND category = ?", (collection, category)
+    ).fetchone()[0]
+
+
+def iter_entries(conn: sqlite3.Connection, collection: str, category: str = None) -> Iterator[tuple]:
+    """
+    Stream ENTRY_COLUMNS rows of a collection (optionally one category) in index order.
+    """
+    if category is None:
+        return conn.execute(
+            f"SELECT {ENTRY_COLUMNS} FROM files WHERE collection = ? ORDER BY sort_key, rel", (collection,)
+        )
+    return conn.execute(
+        f"SELECT {ENTRY_COLUMNS} FROM files WHERE collection = ? AND category = ? ORDER BY sort_key, rel",
+        (collection, category),
+    )
+
+
+def dirty_groups(conn: sqlite3.Connection, collection: str) -> List[Tuple[str, str]]:
+    """
+    (category, month) groups changed since clear_dirty() was last called for collection.
+    """
+    return conn.execute("SELECT category, month FROM dirty WHERE collection = ?", (collection,)).fetchall()
+
+
+def clear_dirty(conn: sqlite3.Connection, collection: str) -> None:
+    with conn:
+        conn.execute("DELETE FROM dirty WHERE collection = ?", (collection,))
+
+
+def iter_recent(conn: sqlite3.Connection, collection: str, limit: int, category: str = None) -> Iterator[tuple]:
+    """
+    Stream the newest `limit` ENTRY_COLUMNS rows (by first_seen) of a collection or category.
+    """
+    if category is None:
+        return conn.execute(
+            f"SELECT {ENTRY_COLUMNS} FROM files WHERE collection = ? "
+            "ORDER BY first_seen DESC, sort_key, rel LIMIT ?", (collection, limit)
+        )
+    return conn.execute(
+        f"SELECT {ENTRY_COLUMNS} FROM files WHERE collection = ? AND category = ? "
+        "ORDER BY first_seen DESC, sort_key, rel LIMIT ?", (collection, category, limit)
+    )
+
+
+def iter_month(conn: sqlite3.Connection, collection: str, month: str) -> Iterator[tuple]:
+    """
+    Stream the ENTRY_COLUMNS rows first seen in month ("YYYY-MM"), newest first.
+    """
+    return conn.execute(
+        f"SELECT {ENTRY_COLUMNS} FROM files WHERE collection = ? AND first_seen >= ? AND first_seen < ? "
+        "ORDER BY first_seen DESC, sort_key, rel", (collection, month, month + "~")
+    )
+
+
+def month_counts(conn: sqlite3.Connection, collection: str) -> Iterator[Tuple[str, int]]:
+    return conn.execute(
+        "SELECT substr(first_seen, 1, 7) AS month, COUNT(*) FROM files WHERE collection = ? "
+        "GROUP BY month ORDER BY month DESC", (collection,)
+    )
+
+
+def category_counts(conn: sqlite3.Connection, collection: str) -> Iterator[Tuple[str, int]]:
+    return conn.execute(
+        "SELECT category, COUNT(*) FROM files WHERE collection = ? GROUP BY category ORDER BY category",
+        (collection,),
+    )
+
+
+def category_bytes(conn: sqlite3.Connection, collection: str) -> Iterator[Tuple[str, int, int]]:
+    """
+    (category, file count, total source bytes) per category, sorted by category.
+    """
+    return conn.execute(
+        "SELECT category, COUNT(*), SUM(size) FROM files WHERE collection = ? GROUP BY category ORDER BY category",
+        (collection,),
+    )
+
+
+def image_infos(conn: sqlite3.Connection) -> Dict[str, Optional[ImageInfo]]:
+    return {
+        path: (ImageInfo(fmt or "", w, h) if w and h else None)
+        for path, fmt, w, h in conn.execute("SELECT path, format, width, height FROM files")
+    }
+
+
+def search(conn: sqlite3.Connection, query: str, collection: str = None, limit: int = 50) -> List[tuple]:
+    """
+    Full-text search over filenames and categories. Plain words are matched as
+    prefixes ("cyber" finds "cyber-cityscape"); returns (collection, path, category).
+    """
+    terms = " ".join('"' + t.replace('"', '""') + '"*' for t in query.split())
+    if not terms:
+        return []
+    sql = (
+        "SELECT f.collection, f.path, f.category FROM files_fts JOIN files f ON f.id = files_fts.rowid "
+        "WHERE files_fts MATCH ?"
+    )
+    params: list = [terms]
+    if collection:
+        sql += " AND f.collection = ?"
+        params.append(collection)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the wallpaper catalog.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Sync the catalog and print per-collection counts.")
+    p_search = sub.add_parser("search", help="Full-text search over filenames and categories.")
+    p_search.add_argument("query")
+    p_search.add_argument("--collection", default=None)
+    p_search.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    # imported here: generate_json imports this module
+
+    collections = load_collections()
+    conn = connect()
+    changes = sync(conn, collections, scan_collections(collections), load_first_seen())
+
+    if args.cmd == "stats":
+        for coll in collections:
+            cats = conn.execute(
+                "SELECT COUNT(DISTINCT category) FROM files WHERE collection = ?", (coll.name,)
+            ).fetchone()[0]
+            size = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE collection = ?", (coll.name,)
+            ).fetchone()[0]
+            print(f"{coll.name}: files={count(conn, coll.name)} categories={cats} bytes={size}")
+        print(f"CATALOG_SUMMARY: inserted={changes['inserted']} updated={changes['updated']} deleted={changes['deleted']}")
+    else:
+        for coll_name, path, category in search(conn, args.query, args.collection, args.limit):
+            print(f"{coll_name}\t{category}\t{path}")
+
+
+if __name__ == "__main__":
+    main()
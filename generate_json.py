@@ -2,145 +2,410 @@
 """
 generate_json.py - generate indexed JSON for wallpapers & categories.
 
-Scans:
+Scans every collection listed in collections.json (see scan_files.py), by default:
   - wallpapers/         -> json/wallpapers.json
   - wallpapers-mobile/  -> json/wallpapers-mobile.json
 
 Writes:
-  - json/wallpapers.json
-  - json/wallpapers-mobile.json
-  - json/categories.json   (contains desktop/mobile category arrays)
+  - one index JSON per collection
+  - json/shards/<collection>/<category>.json   (same format, one category each)
+  - json/categories.json   (one category array per collection name)
+  - json/recent/<collection>.json and json/recent/<collection>/<category>.json
+        the RECENT_LIMIT most recently added entries, newest first
+  - json/archive/<collection>/<YYYY-MM>.json   entries added in that month
+  - json/archive/<collection>.json             [{"month", "count"}], newest first
+  - json/feeds/<collection>.atom               Atom feed of the recent slice
+        (absolute links use "site_url" from collections.json)
+  - json/precache-manifest.js                  service-worker precache list (see precache.py)
+
+"Added" is the first time a build saw a file, kept in json/first_seen.json
+(committed, so it survives fresh checkouts whose mtimes are all "now").
+A missing manifest is seeded from file mtimes. The recent, archive and feed
+files are only re-rendered for the (category, month) groups the catalog
+marked dirty since the last export, or when the file is missing.
+
+The scan is synced into the SQLite catalog (catalog.py) first; only new or
+changed files are probed. The index and shard documents and the month
+archives are then streamed from indexed catalog queries straight into their
+temp files (artifacts.write_stream_if_changed), one entry at a time, and
+category counts come from GROUP BY aggregates.
 
 Each wallpaper entry includes:
-  { "filename","url","thumb_url","size","modified","category" }
+  { "filename","url","thumb_url","size","width","height","modified","added","category" }
+
+width/height come from probe_images.probe (file headers only; null if unknown).
+build_entries() builds the same entries in memory from a scan (used by serve.py).
 
 Behavior:
+ - Source folders are walked to any depth; nested folders produce
+   categories such as "art/pixel".
  - GIFs are included in the index (so they appear in the gallery),
    but **thumb_url will not be provided for .gif** files (so the frontend will
    use the original image as requested).
 
+Outputs are written through artifacts.py: deterministic serialization,
+atomic replace, and no write at all when the content is unchanged.
+"generated_at" only changes when the wallpaper list itself changes.
+
 Quiet operation. Produces JSON files and prints one machine-parseable summary line:
-  JSON_SUMMARY: desktop=N mobile=M total=T time_ms=...
+  JSON_SUMMARY: desktop=N mobile=M total=T misrouted=X added=A changed=C written=W unchanged=U skipped=S time_ms=...
+where misrouted counts images whose aspect ratio contradicts their
+collection's orientation (see probe_images.py --route), added counts files
+new to json/first_seen.json, changed counts files the catalog had to probe
+and skipped counts clean recent/archive/feed files that were not re-rendered.
 """
 
 from pathlib import Path
-import json
 from datetime import datetime, timezone
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Dict, Optional, Set, Tuple
+import json
 import time
 
-# Config: (src_dir, output_json, thumb_root)
-ENTRIES = [
-    (Path("wallpapers"), Path("json/wallpapers.json"), Path("thumbnail/wallpapers-thumb")),
-    (Path("wallpapers-mobile"), Path("json/wallpapers-mobile.json"), Path("thumbnail/mobile-wallpapers-thumb")),
-]
-
-# Known image extensions (we index GIFs too; thumbnails for GIFs are not used)
-IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tiff", ".svg"}
+from artifacts import (FIRST_SEEN_FILE, iso_seconds, load_first_seen, read_stamp, update_first_seen,
+                       write_json_if_changed, write_stream_if_changed, write_text_if_changed)
+from probe_images import ImageInfo, find_misrouted
+from scan_files import RASTER_EXTS, Collection, FileEntry, load_collections, load_site_url, scan_collections
+import catalog
+import precache
 
 CATEGORIES_OUT = Path("json/categories.json")
+SHARDS_DIR = Path("json/shards")
+RECENT_DIR = Path("json/recent")
+ARCHIVE_DIR = Path("json/archive")
+FEEDS_DIR = Path("json/feeds")
 
-
-def is_image(path: Path) -> bool:
-    return path.suffix.lower() in IMAGE_EXTS
+RECENT_LIMIT = 48
 
 
-def make_entry(rel_path: Path, src_root: Path, thumb_root: Path) -> dict:
-    full_path = src_root.joinpath(rel_path)
-    stat = full_path.stat()
-    modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()
+def make_entry(fe: FileEntry, src_root: Path, thumb_root: Path, lazy_thumbs: bool = False,
+               info: Optional[ImageInfo] = None, added: Optional[str] = None,
+               has_thumb: Optional[bool] = None) -> dict:
+    """
+    Build one index entry. With lazy_thumbs (serve.py) thumb_url is set for
+    every raster image, since missing thumbnails are generated on request.
+    has_thumb (from the catalog) saves the stat of the thumbnail; added
+    defaults to the mtime.
+    """
+    rel_path = Path(fe.rel)
+    modified = datetime.fromtimestamp(fe.mtime, tz=timezone.utc).isoformat()
 
-    suffix = full_path.suffix.lower()
+    suffix = rel_path.suffix.lower()
     thumb_url = None
     if suffix != ".gif":
         thumb_candidate = thumb_root.joinpath(rel_path.with_suffix(".webp"))
-        if thumb_candidate.exists():
+        if has_thumb is None:
+            has_thumb = thumb_candidate.exists()
+        if (lazy_thumbs and suffix in RASTER_EXTS) or has_thumb:
             thumb_url = str(thumb_candidate.as_posix())
 
     return {
         "filename": rel_path.name,
         "url": str(src_root.joinpath(rel_path).as_posix()),
         "thumb_url": thumb_url,
-        "size": stat.st_size,
+        "size": fe.size,
+        "width": info.width if info else None,
+        "height": info.height if info else None,
         "modified": modified,
-        "category": rel_path.parent.name if rel_path.parent != Path(".") else "uncategorized"
+        "added": added or iso_seconds(fe.mtime),
+        "category": fe.category,
     }
 
 
-def generate_for(src_dir: Path, out_file: Path, thumb_dir: Path) -> Tuple[List[dict], Dict[str, int]]:
-    if not src_dir.exists() or not src_dir.is_dir():
-        return [], {}
-
+def build_entries(coll: Collection, table: List[FileEntry], lazy_thumbs: bool = False,
+                  infos: Optional[Dict[str, Optional[ImageInfo]]] = None,
+                  first_seen: Optional[Dict[str, str]] = None) -> Tuple[List[dict], Dict[str, int]]:
     entries = []
     cat_counts = {}
+    infos = infos or {}
+    first_seen = first_seen or {}
 
-    # files directly inside root
-    files_root = sorted([x for x in src_dir.iterdir() if x.is_file() and is_image(x)], key=lambda p: p.name.lower())
-    for p in files_root:
-        rel = Path(p.name)
-        ent = make_entry(rel, src_dir, thumb_dir)
+    for fe in table:
+        ent = make_entry(fe, coll.src, coll.thumb_root, lazy_thumbs, infos.get(fe.path),
+                         first_seen.get(Path(fe.path).as_posix()))
         entries.append(ent)
         cat = ent["category"] or "uncategorized"
         cat_counts[cat] = cat_counts.get(cat, 0) + 1
 
-    # subdirectories (categories)
-    dirs = sorted([x for x in src_dir.iterdir() if x.is_dir()], key=lambda p: p.name.lower())
-    for d in dirs:
-        files = sorted([x for x in d.iterdir() if x.is_file() and is_image(x)], key=lambda p: p.name.lower())
-        for f in files:
-            rel = Path(d.name) / f.name
-            ent = make_entry(rel, src_dir, thumb_dir)
-            entries.append(ent)
-            cat = ent["category"] or "uncategorized"
-            cat_counts[cat] = cat_counts.get(cat, 0) + 1
-
-    # write JSON
-    out_file.parent.mkdir(parents=True, exist_ok=True)
-    data = {
+    return entries, cat_counts
+
+
+def index_payload(entries: List[dict]) -> dict:
+    return {
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "count": len(entries),
         "wallpapers": entries
     }
-    with out_file.open("w", encoding="utf-8") as fh:
-        json.dump(data, fh, indent=2, ensure_ascii=False)
 
-    return entries, cat_counts
+
+def category_array(counts: Dict[str, int]) -> List[dict]:
+    total = sum(counts.values()) if counts else 0
+    arr = []
+    arr.append({"name": "all", "label": "All", "count": total})
+    for k in sorted(counts.keys()):
+        arr.append({"name": k, "label": k, "count": counts[k]})
+    return arr
+
+
+def entry_rows(coll: Collection, rows) -> List[dict]:
+    out = []
+    for row in rows:
+        fe, info, added, has_thumb = catalog.row_to_entry(row)
+        out.append(make_entry(fe, coll.src, coll.thumb_root, info=info, added=added, has_thumb=has_thumb))
+    return out
+
+
+def render_entries(coll: Collection, rows) -> Iterator[str]:
+    """
+    Yield the entries of the "wallpapers" array one by one, formatted exactly
+    like json.dumps(..., indent=2) of the whole document.
+    """
+    sep = "\n"
+    for row in rows:
+        fe, info, added, has_thumb = catalog.row_to_entry(row)
+        ent = json.dumps(make_entry(fe, coll.src, coll.thumb_root, info=info, added=added, has_thumb=has_thumb),
+                         indent=2, ensure_ascii=False)
+        yield sep + ent.replace("\n", "\n    ").join(("    ", ""))
+        sep = ",\n"
+
+
+def index_head(stamp: str, count: int) -> str:
+    return (
+        "{\n"
+        f'  "generated_at": {json.dumps(stamp)},\n'
+        f'  "count": {count},\n'
+        '  "wallpapers": ' + ("[" if count else "[]")
+    )
+
+
+def index_tail(coll: Collection, rows, count: int) -> Iterator[str]:
+    """
+    Everything after index_head(): the entries (count of them) and the closing brackets.
+    """
+    if count:
+        yield from render_entries(coll, rows)
+        yield "\n  ]"
+    yield "\n}"
+
+
+def export_rows(coll: Collection, rows, count: int, out_file: Path) -> bool:
+    """
+    Stream count catalog rows into one index-format document; generated_at
+    is kept when the entries are unchanged. Returns True if written.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    old_stamp = read_stamp(out_file)
+    return write_stream_if_changed(out_file, index_head(now, count), index_tail(coll, rows, count),
+                                   index_head(old_stamp, count) if old_stamp is not None else None)
+
+
+def export_index(conn, coll: Collection, out_file: Path, category: str = None) -> bool:
+    """
+    Write one index document (whole collection or one category shard) from the catalog.
+    """
+    return export_rows(coll, catalog.iter_entries(conn, coll.name, category),
+                       catalog.count(conn, coll.name, category), out_file)
+
+
+def feed_text(coll: Collection, entries: List[dict], site_url: str) -> str:
+    """
+    Atom feed of entries; links are site_url (see scan_files.load_site_url)
+    joined with the percent-encoded site-relative paths.
+    """
+    # imported here: xml.sax pulls in a lot and is only needed when a feed is rendered
+    from urllib.parse import quote
+    from xml.sax.saxutils import escape, quoteattr
+
+    feed_url = site_url + quote(feed_path(coll).as_posix())
+    updated = entries[0]["added"] if entries else "1970-01-01T00:00:00+00:00"
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        f"  <id>{escape(feed_url)}</id>",
+        f"  <title>{escape(f'Wallpapers - {coll.name}')}</title>",
+        f"  <updated>{updated}</updated>",
+        f"  <link rel=\"self\" href={quoteattr(feed_url)}/>",
+        f"  <link href={quoteattr(site_url)}/>",
+        "  <author><name>wallpapers</name></author>",
+    ]
+    for ent in entries:
+        url = site_url + quote(ent["url"])
+        lines += [
+            "  <entry>",
+            f"    <id>{escape(url)}</id>",
+            f"    <title>{escape(ent['filename'])}</title>",
+            f"    <updated>{ent['added']}</updated>",
+            f"    <link href={quoteattr(url)}/>",
+            f"    <category term={quoteattr(ent['category'])}/>",
+        ]
+        if ent["thumb_url"]:
+            img = "<img src=" + quoteattr(site_url + quote(ent["thumb_url"])) + ">"
+            lines.append(f'    <content type="html">{escape(img)}</content>')
+        lines.append("  </entry>")
+    lines.append("</feed>")
+    return "\n".join(lines) + "\n"
 
 
-def main():
+def shard_path(coll: Collection, category: str) -> Path:
+    return SHARDS_DIR / coll.name / f"{category}.json"
+
+
+def recent_path(coll: Collection, category: str = None) -> Path:
+    if category is None:
+        return RECENT_DIR / f"{coll.name}.json"
+    return RECENT_DIR / coll.name / f"{category}.json"
+
+
+def month_path(coll: Collection, month: str) -> Path:
+    return ARCHIVE_DIR / coll.name / f"{month}.json"
+
+
+def feed_path(coll: Collection) -> Path:
+    return FEEDS_DIR / f"{coll.name}.atom"
+
+
+def prune_dir(root: Path, expected: Set[Path], pattern: str = "*.json") -> None:
+    """
+    Remove files under root that are not in expected, then empty directories.
+    """
+    if not root.exists():
+        return
+    for p in root.rglob(pattern):
+        if p not in expected:
+            p.unlink()
+    for d in sorted((d for d in root.rglob("*") if d.is_dir()), reverse=True):
+        if not any(d.iterdir()):
+            d.rmdir()
+
+
+def generate_for(conn, coll: Collection) -> Tuple[List[dict], int, List[bool]]:
+    """
+    Export a collection's index and per-category shards.
+    Returns (categories.json array, entry count, [written flag per artifact]).
+    """
+    writes = [export_index(conn, coll, coll.json_out)]
+
+    arr = [{"name": "all", "label": "All", "count": catalog.count(conn, coll.name)}]
+    expected = set()
+    for category, n in catalog.category_counts(conn, coll.name).fetchall():
+        arr.append({"name": category, "label": category, "count": n})
+        shard = shard_path(coll, category)
+        expected.add(shard)
+        writes.append(export_index(conn, coll, shard, category))
+
+    # drop shards of categories that no longer exist
+    prune_dir(SHARDS_DIR / coll.name, expected)
+
+    return arr, arr[0]["count"], writes
+
+
+def generate_recent_for(conn, coll: Collection, categories: List[str], site_url: str) -> Tuple[List[bool], int]:
+    """
+    Export the recent slices, month archives and Atom feed of a collection,
+    re-rendering only what the catalog's dirty groups touch (or what is missing).
+    Returns ([written flag per rendered artifact], number of clean files skipped).
+    """
+    dirty = catalog.dirty_groups(conn, coll.name)
+    dirty_cats = {cat for cat, _ in dirty}
+    dirty_months = {month for _, month in dirty}
+    writes = []
+    skipped = 0
+
+    def needed(path: Path, is_dirty: bool) -> bool:
+        nonlocal skipped
+        if is_dirty or not path.exists():
+            return True
+        skipped += 1
+        return False
+
+    # the collection's recent slice and its feed are rendered from the same entries
+    if dirty or not recent_path(coll).exists() or not feed_path(coll).exists():
+        entries = entry_rows(coll, catalog.iter_recent(conn, coll.name, RECENT_LIMIT))
+        writes.append(write_json_if_changed(recent_path(coll), {"count": len(entries), "wallpapers": entries}))
+        writes.append(write_text_if_changed(feed_path(coll), feed_text(coll, entries, site_url)))
+    else:
+        skipped += 2
+
+    expected = set()
+    for category in categories:
+        out = recent_path(coll, category)
+        expected.add(out)
+        if needed(out, category in dirty_cats):
+            entries = entry_rows(coll, catalog.iter_recent(conn, coll.name, RECENT_LIMIT, category))
+            writes.append(write_json_if_changed(out, {"count": len(entries), "wallpapers": entries}))
+    prune_dir(RECENT_DIR / coll.name, expected)
+
+    months = catalog.month_counts(conn, coll.name).fetchall()
+    expected = set()
+    for month, n in months:
+        out = month_path(coll, month)
+        expected.add(out)
+        if needed(out, month in dirty_months):
+            writes.append(export_rows(coll, catalog.iter_month(conn, coll.name, month), n, out))
+    prune_dir(ARCHIVE_DIR / coll.name, expected)
+    writes.append(write_json_if_changed(ARCHIVE_DIR / f"{coll.name}.json",
+                                        [{"month": m, "count": n} for m, n in months]))
+
+    catalog.clear_dirty(conn, coll.name)
+    return writes, skipped
+
+
+def main(argv=None, tables: Optional[Dict[str, List[FileEntry]]] = None):
+    """
+    The script takes no options; argv is accepted (and ignored) so
+    build_all.py can call every stage the same way. tables: a scan of the
+    source trees to reuse (build_all.py scans once for every stage); scanned
+    here when None.
+    """
     t0 = time.perf_counter()
 
-    categories_summary = {
-        "desktop": [],
-        "mobile": []
-    }
-    desktop_count = 0
-    mobile_count = 0
-
-    for src, out, thumb in ENTRIES:
-        entries, counts = generate_for(src, out, thumb)
-        total = sum(counts.values()) if counts else 0
-        arr = []
-        arr.append({"name": "all", "label": "All", "count": total})
-        for k in sorted(counts.keys()):
-            arr.append({"name": k, "label": k, "count": counts[k]})
-        if src.name.startswith("wallpapers-mobile"):
-            categories_summary["mobile"] = arr
-            mobile_count = total
-        else:
-            categories_summary["desktop"] = arr
-            desktop_count = total
-
-    # write categories.json
-    CATEGORIES_OUT.parent.mkdir(parents=True, exist_ok=True)
-    with CATEGORIES_OUT.open("w", encoding="utf-8") as fh:
-        json.dump(categories_summary, fh, indent=2, ensure_ascii=False)
+    collections = load_collections()
+    site_url = load_site_url()
+    if tables is None:
+        tables = scan_collections(collections)
+
+    first_seen, added = update_first_seen(tables, load_first_seen())
+
+    conn = catalog.connect()
+    sync_stats = catalog.sync(conn, collections, tables, first_seen)
+    misrouted = find_misrouted(collections, tables, catalog.image_infos(conn))
+
+    categories_summary = {}
+    counts_by_name = {}
+    writes = []
+    skipped = 0
+
+    for coll in collections:
+        if not coll.src.is_dir():
+            categories_summary[coll.name] = category_array({})
+            counts_by_name[coll.name] = 0
+            continue
+        arr, total, coll_writes = generate_for(conn, coll)
+        categories_summary[coll.name] = arr
+        counts_by_name[coll.name] = total
+        writes.extend(coll_writes)
+        recent_writes, coll_skipped = generate_recent_for(conn, coll, [c["name"] for c in arr[1:]], site_url)
+        writes.extend(recent_writes)
+        skipped += coll_skipped
+
+    # write categories.json and the first-seen manifest
+    writes.append(write_json_if_changed(CATEGORIES_OUT, categories_summary))
+    writes.append(write_json_if_changed(FIRST_SEEN_FILE, first_seen))
+
+    # last: the service-worker manifest reuses the hashes of everything written above
+    writes.append(precache.write_manifest(conn, collections)[0])
+    conn.close()
+    written_count = sum(1 for w in writes if w)
 
     elapsed_ms = int((time.perf_counter() - t0) * 1000)
-    total_count = desktop_count + mobile_count
+    total_count = sum(counts_by_name.values())
 
-    # machine-parseable single line
-    print(f"JSON_SUMMARY: desktop={desktop_count} mobile={mobile_count} total={total_count} time_ms={elapsed_ms}")
+    # machine-parseable single line (desktop/mobile always present for build_all.py)
+    counts_by_name.setdefault("desktop", 0)
+    counts_by_name.setdefault("mobile", 0)
+    per_coll = " ".join(f"{k}={v}" for k, v in counts_by_name.items())
+    print(f"JSON_SUMMARY: {per_coll} total={total_count} misrouted={len(misrouted)} added={added} "
+          f"changed={sync_stats['inserted'] + sync_stats['updated']} "
+          f"written={written_count} unchanged={len(writes) - written_count} skipped={skipped} time_ms={elapsed_ms}")
 
 
 if __name__ == "__main__":
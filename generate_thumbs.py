@@ -2,116 +2,193 @@
 """
 generate_thumbs.py - generate thumbnails preserving subfolder structure.
 
-Writes thumbnails into:
+Writes thumbnails for every collection in collections.json (see scan_files.py), by default:
   - thumbnail/wallpapers-thumb/<category>/*.webp
   - thumbnail/mobile-wallpapers-thumb/<category>/*.webp
 
+Nested category folders are mirrored to any depth.
+
+Failures:
+ - Files that fail to decode/encode are recorded in a negative cache
+   (the failures table of the catalog, see catalog.py) keyed by path with size, mtime, error class
+   and message. They are skipped ("quarantined") on later runs until the
+   file changes; --retry-failed ignores the cache for one run.
+ - .cache/thumb_failures_report.json lists every known-bad file.
+ - --verify runs a parallel Image.verify() pre-pass over the files that
+   need (re)encoding, so corrupt files are caught before the encode stage.
+
 Behavior:
  - Animated GIFs (.gif) are skipped (no thumbnails).
  - This script is intentionally quiet during processing and emits a
    single summary line at the end:
-     THUMBS_SUMMARY: created=... up_to_date=... skipped_gif=... failed=... total=... time_ms=...
+     THUMBS_SUMMARY: created=... up_to_date=... skipped_gif=... failed=... quarantined=... total=... time_ms=...
+   total counts image files only; other files in the source folders are
+   no longer part of the scanned file table.
+
+Pillow is imported only when a file actually needs (re)encoding or
+verifying, so an up-to-date run never loads it.
+
+Usage:
+  python generate_thumbs.py [--verify] [--retry-failed]
 """
 
 from pathlib import Path
-from PIL import Image
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import argparse
+import io
+import os
 import sys
 import time
 
-SRC_DESKTOP = Path("wallpapers")
-SRC_MOBILE = Path("wallpapers-mobile")
-OUT_ROOT = Path("thumbnail")
-OUT_DESKTOP = OUT_ROOT / "wallpapers-thumb"
-OUT_MOBILE = OUT_ROOT / "mobile-wallpapers-thumb"
-
+from artifacts import write_json_if_changed
+from scan_files import RASTER_EXTS, FileEntry, load_collections, scan_collections
+import catalog
 
-DESKTOP_MAX = (640, 360)
-MOBILE_MAX = (540, 960)
-
-# Raster extensions we WILL create thumbnails for (GIF intentionally excluded)
-RASTER_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff"}
+OUT_ROOT = Path("thumbnail")
 
 OUT_FORMAT = "WEBP"
 OUT_QUALITY = 90
 
+CACHE_DIR = Path(".cache")
+FAILURE_REPORT = CACHE_DIR / "thumb_failures_report.json"
+
+VERIFY_WORKERS = min(16, (os.cpu_count() or 1) * 2)
 
-def should_process(src: Path, dst: Path) -> bool:
+
+def should_process(src: FileEntry, dst: Path) -> bool:
     """
-    Return True if we should (re)create dst from src.
+    Return True if we should (re)create dst from src (mtime comes from the scan).
     """
-    if not src.exists():
-        return False
-    if not dst.exists():
-        return True
     try:
-        return src.stat().st_mtime > dst.stat().st_mtime
+        return src.mtime > dst.stat().st_mtime
     except Exception:
         return True
 
 
-def make_thumb(src_path: Path, dst_path: Path, max_size):
+def encode_thumb(src_path: Path, max_size) -> bytes:
     """
-    Create a WEBP thumbnail for src_path at dst_path.
+    Return the encoded WEBP thumbnail bytes for src_path.
     Raises exception on failure.
     """
+    from PIL import Image
+
     with Image.open(src_path) as im:
         if im.mode not in ("RGB", "L"):
             im = im.convert("RGB")
         im.thumbnail(max_size, Image.LANCZOS)
-        dst_path.parent.mkdir(parents=True, exist_ok=True)
-        im.save(str(dst_path), OUT_FORMAT, quality=OUT_QUALITY, method=6)
+        buf = io.BytesIO()
+        im.save(buf, OUT_FORMAT, quality=OUT_QUALITY, method=6)
+    return buf.getvalue()
 
 
-def process_folder_recursive(src_dir: Path, out_dir: Path, max_size, counters: dict):
+def make_thumb(src_path: Path, dst_path: Path, max_size):
     """
-    Process files in src_dir root and in one level of subfolders (categories).
-    Updates counters dict with keys: total, created, up_to_date, skipped_gif, failed
+    Create a WEBP thumbnail for src_path at dst_path.
+    Raises exception on failure.
     """
-    if not src_dir.exists() or not src_dir.is_dir():
-        return
+    data = encode_thumb(src_path, max_size)
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    dst_path.write_bytes(data)
 
-    # top-level files
-    for p in sorted(src_dir.iterdir()):
-        if p.is_file():
-            counters["total"] += 1
-            sfx = p.suffix.lower()
-            if sfx == ".gif":
-                counters["skipped_gif"] += 1
-                continue
-            if sfx not in RASTER_EXTS:
-                continue
-            dst_name = p.with_suffix("." + OUT_FORMAT.lower()).name
-            dst_path = out_dir / dst_name
-            try:
-                if should_process(p, dst_path):
-                    make_thumb(p, dst_path, max_size)
-                    counters["created"] += 1
-                else:
-                    counters["up_to_date"] += 1
-            except Exception:
-                counters["failed"] += 1
-
-    # subfolders (categories)
-    for d in sorted([x for x in src_dir.iterdir() if x.is_dir()]):
-        for p in sorted([x for x in d.iterdir() if x.is_file()]):
-            counters["total"] += 1
-            sfx = p.suffix.lower()
-            if sfx == ".gif":
-                counters["skipped_gif"] += 1
-                continue
-            if sfx not in RASTER_EXTS:
-                continue
-            rel = Path(d.name) / p.name
-            dst_rel = rel.with_suffix("." + OUT_FORMAT.lower())
-            dst_path = out_dir / dst_rel
-            try:
-                if should_process(p, dst_path):
-                    make_thumb(p, dst_path, max_size)
-                    counters["created"] += 1
-                else:
-                    counters["up_to_date"] += 1
-            except Exception:
-                counters["failed"] += 1
+
+# ---------- negative cache ----------
+def is_known_bad(bad: dict, fe: FileEntry) -> bool:
+    rec = bad.get(fe.path)
+    return rec is not None and rec.get("size") == fe.size and rec.get("mtime") == fe.mtime
+
+
+def record_failure(bad: dict, fe: FileEntry, exc: BaseException, stage: str) -> None:
+    bad[fe.path] = {
+        "size": fe.size,
+        "mtime": fe.mtime,
+        "error": type(exc).__name__,
+        "message": str(exc),
+        "stage": stage,
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def failure_report(bad: dict) -> dict:
+    failures = [{"path": k, **v} for k, v in sorted(bad.items())]
+    return {"count": len(failures), "failures": failures}
+
+
+# ---------- processing ----------
+def verify_image(path: str):
+    """
+    Cheap integrity check (no full decode). Returns the exception or None.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as im:
+            im.verify()
+    except Exception as e:
+        return e
+    return None
+
+
+def plan_table(table, out_dir: Path, bad: dict, counters: dict, retry_failed: bool = False) -> list:
+    """
+    Classify every file of a collection's file table (see scan_files.scan_collections).
+    Returns the [(FileEntry, dst_path)] that need (re)encoding.
+    Updates counters dict with keys: total, up_to_date, skipped_gif, quarantined
+    """
+    todo = []
+    for fe in table:
+        counters["total"] += 1
+        sfx = Path(fe.rel).suffix.lower()
+        if sfx == ".gif":
+            counters["skipped_gif"] += 1
+            continue
+        if sfx not in RASTER_EXTS:
+            continue
+        if not retry_failed and is_known_bad(bad, fe):
+            counters["quarantined"] += 1
+            continue
+        dst_rel = Path(fe.rel).with_suffix("." + OUT_FORMAT.lower())
+        dst_path = out_dir / dst_rel
+        if should_process(fe, dst_path):
+            todo.append((fe, dst_path))
+        else:
+            counters["up_to_date"] += 1
+            bad.pop(fe.path, None)
+    return todo
+
+
+def verify_todo(todo: list, bad: dict, counters: dict) -> list:
+    """
+    Run Image.verify() over todo in parallel; record and drop corrupt files.
+    """
+    if not todo:
+        return todo
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=VERIFY_WORKERS) as pool:
+        results = list(pool.map(lambda item: verify_image(item[0].path), todo))
+    ok = []
+    for item, err in zip(todo, results):
+        if err is None:
+            ok.append(item)
+        else:
+            record_failure(bad, item[0], err, "verify")
+            counters["failed"] += 1
+    return ok
+
+
+def process_todo(todo: list, max_size, bad: dict, counters: dict) -> None:
+    """
+    Encode thumbnails. Updates counters dict with keys: created, failed
+    """
+    for fe, dst_path in todo:
+        try:
+            make_thumb(Path(fe.path), dst_path, max_size)
+            counters["created"] += 1
+            bad.pop(fe.path, None)
+        except Exception as e:
+            record_failure(bad, fe, e, "encode")
+            counters["failed"] += 1
 
 
 def count_existing_thumbs(root: Path) -> int:
@@ -124,7 +201,16 @@ def count_existing_thumbs(root: Path) -> int:
     return total
 
 
-def main():
+def main(argv=None, tables: Optional[Dict[str, List[FileEntry]]] = None):
+    """
+    tables: a scan of the source trees to reuse (build_all.py scans once for
+    every stage); scanned here when None.
+    """
+    parser = argparse.ArgumentParser(description="Generate wallpaper thumbnails.")
+    parser.add_argument("--verify", action="store_true", help="Run a parallel Image.verify() pre-pass before encoding.")
+    parser.add_argument("--retry-failed", action="store_true", help="Ignore the negative cache and retry known-bad files.")
+    args = parser.parse_args(argv)
+
     t0 = time.perf_counter()
 
     counters = {
@@ -133,13 +219,34 @@ def main():
         "up_to_date": 0,
         "skipped_gif": 0,
         "failed": 0,
+        "quarantined": 0,
     }
 
     existing_before = count_existing_thumbs(OUT_ROOT)
 
     # run processors (quiet)
-    process_folder_recursive(SRC_DESKTOP, OUT_DESKTOP, DESKTOP_MAX, counters)
-    process_folder_recursive(SRC_MOBILE, OUT_MOBILE, MOBILE_MAX, counters)
+    collections = load_collections()
+    if tables is None:
+        tables = scan_collections(collections)
+    conn = catalog.connect()
+    bad = catalog.load_failures(conn)
+
+    plans = []
+    for coll in collections:
+        todo = plan_table(tables.get(coll.name, []), coll.thumb_root, bad, counters, args.retry_failed)
+        plans.append((coll, todo))
+    if args.verify:
+        plans = [(coll, verify_todo(todo, bad, counters)) for coll, todo in plans]
+    for coll, todo in plans:
+        process_todo(todo, coll.max_size, bad, counters)
+
+    # forget files that no longer exist
+    scanned = {fe.path for t in tables.values() for fe in t}
+    for path in [p for p in bad if p not in scanned]:
+        del bad[path]
+    catalog.save_failures(conn, bad)
+    conn.close()
+    write_json_if_changed(FAILURE_REPORT, failure_report(bad))
 
     existing_after = count_existing_thumbs(OUT_ROOT)
     elapsed_ms = int((time.perf_counter() - t0) * 1000)
@@ -149,13 +256,16 @@ def main():
     up_to_date = counters["up_to_date"]
     skipped = counters["skipped_gif"]
     failed = counters["failed"]
+    quarantined = counters["quarantined"]
     total = counters["total"]
     delta = existing_after - existing_before
 
-    print(f"Created {created} thumbnails (skipped {skipped} GIFs, {up_to_date} up-to-date, {failed} failed).")
+    print(f"Created {created} thumbnails (skipped {skipped} GIFs, {up_to_date} up-to-date, {failed} failed, {quarantined} quarantined).")
+    if failed:
+        print(f"Failures recorded in {FAILURE_REPORT}")
     # machine-parseable summary (one line)
     print(
-        f"THUMBS_SUMMARY: created={created} up_to_date={up_to_date} skipped_gif={skipped} failed={failed} "
+        f"THUMBS_SUMMARY: created={created} up_to_date={up_to_date} skipped_gif={skipped} failed={failed} quarantined={quarantined} "
         f"total_processed={total} existing_before={existing_before} existing_after={existing_after} added={delta} time_ms={elapsed_ms}"
     )
 
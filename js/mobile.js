@@ -426,10 +426,10 @@
         arr.sort((a, b) => b.filename.localeCompare(a.filename));
         break;
       case "time-desc":
-        arr.sort((a, b) => new Date(b.modified) - new Date(a.modified));
+        arr.sort((a, b) => b._t - a._t);
         break;
       case "time-asc":
-        arr.sort((a, b) => new Date(a.modified) - new Date(b.modified));
+        arr.sort((a, b) => a._t - b._t);
         break;
       case "size-desc":
         arr.sort((a, b) => b.size - a.size);
@@ -446,7 +446,7 @@
 
   async function loadCategoriesJson() {
     try {
-      const resp = await fetch(CATEGORIES_PATH, { cache: "no-store" });
+      const resp = await fetch(CATEGORIES_PATH, { cache: "no-cache" });
       if (!resp.ok) throw new Error("no categories.json");
       return await resp.json();
     } catch (e) {
@@ -487,6 +487,8 @@
         throw new Error(`Failed to fetch ${JSON_PATH}: ${resp.status}`);
       const data = await resp.json();
       wallpapers = data.wallpapers || [];
+      // parse the sort timestamp once instead of inside every comparator
+      wallpapers.forEach((w) => (w._t = Date.parse(w.modified) || 0));
       filtered = [...wallpapers];
 
       // load categories JSON to get counts; if missing compute
@@ -628,7 +630,7 @@
   // small helper to load categories.json for mobile
   async function loadCategoriesJson() {
     try {
-      const r = await fetch(CATEGORIES_PATH, { cache: "no-store" });
+      const r = await fetch(CATEGORIES_PATH, { cache: "no-cache" });
       if (!r.ok) throw new Error("no categories");
       return await r.json();
     } catch (e) {
@@ -606,10 +606,10 @@
         filtered.sort((a, b) => b.filename.localeCompare(a.filename));
         break;
       case "time-desc":
-        filtered.sort((a, b) => new Date(b.modified) - new Date(a.modified));
+        filtered.sort((a, b) => b._t - a._t);
         break;
       case "time-asc":
-        filtered.sort((a, b) => new Date(a.modified) - new Date(b.modified));
+        filtered.sort((a, b) => a._t - b._t);
         break;
       case "size-desc":
         filtered.sort((a, b) => b.size - a.size);
@@ -625,10 +625,13 @@
 
   async function loadWallpapers() {
     try {
-      const resp = await fetch(JSON_PATH, { cache: "no-store" });
+      const resp = await fetch(JSON_PATH, { cache: "no-cache" });
       if (!resp.ok) throw new Error("Could not load wallpapers.json");
       const json = await resp.json();
-      return json.wallpapers || [];
+      const list = json.wallpapers || [];
+      // parse the sort timestamp once instead of inside every comparator
+      list.forEach((w) => (w._t = Date.parse(w.modified) || 0));
+      return list;
     } catch (err) {
       console.error("Failed to load", JSON_PATH, err);
       return [];
@@ -637,7 +640,7 @@
 
   async function loadCategories() {
     try {
-      const resp = await fetch(CATEGORIES_PATH, { cache: "no-store" });
+      const resp = await fetch(CATEGORIES_PATH, { cache: "no-cache" });
       if (!resp.ok) throw new Error("Could not load categories.json");
       const json = await resp.json();
       return json || {};
@@ -653,7 +656,7 @@
   async function loadFavoritesList() {
     // try favorites.json first
     try {
-      const resp = await fetch(FAVORITES_JSON, { cache: "no-store" });
+      const resp = await fetch(FAVORITES_JSON, { cache: "no-cache" });
       if (resp.ok) {
         const json = await resp.json();
         if (Array.isArray(json.favorites)) return json.favorites;
@@ -736,7 +739,7 @@
     if (MODE === "all") {
       data = all.slice();
       // default newest first
-      data.sort((a, b) => new Date(b.modified) - new Date(a.modified));
+      data.sort((a, b) => b._t - a._t);
       filtered = data.slice();
       selectedCategory = "all";
       renderCategoryChips();
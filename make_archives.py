@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+make_archives.py - build release zips plus incremental deltas.
+
+For every collection with an "archive" name in collections.json this writes
+into the output directory (default dist/):
+
+  <archive>.zip              full archive: the image files (IMAGE_EXTS) of the
+                             collection scan, same layout as `zip -r <src>`
+  <archive>.manifest.json    what went into it: {path: {size, mtime, id}}
+  <archive>-delta.zip        files added/changed since the previous manifest,
+                             plus DELETED.txt listing removed paths
+  <archive>-delta.json       the added/changed/removed lists and both build stamps
+
+File ids are git blob ids. They are read from the git index (`git ls-files -s`)
+when available, reused from the previous manifest when size and mtime match,
+and only hashed otherwise - so after a fresh CI checkout nothing is re-read,
+and the delta costs time proportional to the number of changed files.
+
+The previous manifests are read from --previous (default .cache/archives/,
+where every run leaves a copy of its manifests); the release workflow
+downloads them from the latest release instead. Without a previous manifest
+no delta is produced. A delta only applies on top of that one previous
+release: anyone further behind needs the full archive.
+
+Already-compressed formats are stored, not deflated.
+
+Usage:
+  python make_archives.py [--out dist] [--previous DIR]
+
+Prints one summary line per archive:
+  ARCHIVE_SUMMARY: archive=wallpaper-all.zip files=N added=A changed=C removed=R full_bytes=F delta_bytes=D delta_pct=P time_ms=...
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import time
+import zipfile
+
+from artifacts import dump_json, write_text_if_changed
+from scan_files import Collection, FileEntry, load_collections, scan_collections
+
+DEFAULT_OUT = Path("dist")
+MANIFEST_CACHE = Path(".cache/archives")
+
+# Formats that do not shrink under deflate
+STORED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+DELETED_LIST = "DELETED.txt"
+
+
+def blob_id(path: str, size: int) -> str:
+    """
+    git-compatible blob id (sha1 of "blob <size>\\0" + content).
+    """
+    h = hashlib.sha1(b"blob %d\0" % size)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _git_z(*args) -> Optional[List[bytes]]:
+    try:
+        proc = subprocess.run(["git", *args], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [rec for rec in proc.stdout.split(b"\0") if rec]
+
+
+def git_blob_ids(roots: List[str]) -> Dict[str, str]:
+    """
+    {posix path: blob id} from the git index for clean tracked files under roots.
+    Empty outside a git checkout.
+    """
+    staged = _git_z("ls-files", "-s", "-z", "--", *roots)
+    if not staged:
+        return {}
+    ids = {}
+    for rec in staged:
+        meta, path = rec.split(b"\t", 1)
+        ids[path.decode("utf-8", "surrogateescape")] = meta.split()[1].decode("ascii")
+    for rec in _git_z("ls-files", "-m", "-z", "--", *roots) or []:
+        ids.pop(rec.decode("utf-8", "surrogateescape"), None)
+    return ids
+
+
+def load_manifest(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) and isinstance(data.get("files"), dict) else None
+    except Exception:
+        return None
+
+
+def build_manifest(archive: str, table: List[FileEntry], git_ids: Dict[str, str], previous: Optional[dict]) -> dict:
+    prev_files = previous["files"] if previous else {}
+    files = {}
+    for fe in table:
+        arc = Path(fe.path).as_posix()
+        fid = git_ids.get(arc)
+        if fid is None:
+            old = prev_files.get(arc)
+            if old and old.get("size") == fe.size and old.get("mtime") == fe.mtime:
+                fid = old["id"]
+            else:
+                fid = blob_id(fe.path, fe.size)
+        files[arc] = {"size": fe.size, "mtime": fe.mtime, "id": fid}
+    return {
+        "archive": archive,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "count": len(files),
+        "files": files,
+    }
+
+
+def diff_manifests(previous: dict, current: dict) -> dict:
+    prev_files = previous["files"]
+    cur_files = current["files"]
+    added = [p for p in cur_files if p not in prev_files]
+    changed = [p for p in cur_files if p in prev_files and prev_files[p]["id"] != cur_files[p]["id"]]
+    removed = sorted(p for p in prev_files if p not in cur_files)
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def write_zip(zip_path: Path, arcnames: List[str], extra: Optional[Dict[str, str]] = None) -> int:
+    """
+    Write arcnames (paths relative to the repo root) into zip_path; returns its size.
+    """
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = zip_path.with_name(zip_path.name + ".tmp")
+    with zipfile.ZipFile(tmp, "w", allowZip64=True) as zf:
+        for arc in arcnames:
+            method = zipfile.ZIP_STORED if Path(arc).suffix.lower() in STORED_EXTS else zipfile.ZIP_DEFLATED
+            zf.write(arc, arc, compress_type=method)
+        for name, text in (extra or {}).items():
+            zf.writestr(name, text, compress_type=zipfile.ZIP_DEFLATED)
+    tmp.replace(zip_path)
+    return zip_path.stat().st_size
+
+
+def archive_collection(coll: Collection, table: List[FileEntry], git_ids: Dict[str, str],
+                       out_dir: Path, prev_dir: Path) -> dict:
+    t0 = time.perf_counter()
+    stem = Path(coll.archive).stem
+    previous = load_manifest(prev_dir / f"{stem}.manifest.json")
+    manifest = build_manifest(coll.archive, table, git_ids, previous)
+
+    full_bytes = write_zip(out_dir / coll.archive, list(manifest["files"]))
+    write_text_if_changed(out_dir / f"{stem}.manifest.json", dump_json(manifest))
+
+    stats = {"archive": coll.archive, "files": manifest["count"], "full_bytes": full_bytes}
+    delta_zip = out_dir / f"{stem}-delta.zip"
+    if previous is None:
+        delta_zip.unlink(missing_ok=True)
+        (out_dir / f"{stem}-delta.json").unlink(missing_ok=True)
+        stats.update(added=manifest["count"], changed=0, removed=0, delta_bytes=0)
+    else:
+        diff = diff_manifests(previous, manifest)
+        extra = {DELETED_LIST: "".join(p + "\n" for p in diff["removed"])} if diff["removed"] else None
+        delta_bytes = write_zip(delta_zip, diff["added"] + diff["changed"], extra)
+        write_text_if_changed(out_dir / f"{stem}-delta.json", dump_json({
+            "archive": f"{stem}-delta.zip",
+            "base_generated_at": previous.get("generated_at"),
+            "generated_at": manifest["generated_at"],
+            **diff,
+        }))
+        stats.update(added=len(diff["added"]), changed=len(diff["changed"]),
+                     removed=len(diff["removed"]), delta_bytes=delta_bytes)
+    stats["time_ms"] = int((time.perf_counter() - t0) * 1000)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build full and delta wallpaper archives.")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help=f"Output directory (default {DEFAULT_OUT}).")
+    parser.add_argument("--previous", type=Path, default=MANIFEST_CACHE,
+                        help=f"Directory holding the previous *.manifest.json files (default {MANIFEST_CACHE}).")
+    args = parser.parse_args(argv)
+
+    collections = [c for c in load_collections() if c.archive]
+    tables = scan_collections(collections)
+    git_ids = git_blob_ids([c.src.as_posix() for c in collections])
+
+    for coll in collections:
+        table = tables.get(coll.name, [])
+        if not table:
+            print(f"No files in {coll.src.as_posix()}/ - skipping {coll.archive}")
+            continue
+        st = archive_collection(coll, table, git_ids, args.out, args.previous)
+        pct = (100.0 * st["delta_bytes"] / st["full_bytes"]) if st["full_bytes"] else 0.0
+        print(
+            f"ARCHIVE_SUMMARY: archive={st['archive']} files={st['files']} added={st['added']} changed={st['changed']} "
+            f"removed={st['removed']} full_bytes={st['full_bytes']} delta_bytes={st['delta_bytes']} "
+            f"delta_pct={pct:.2f} time_ms={st['time_ms']}"
+        )
+
+        # keep this build's manifest as the base for the next local run
+        MANIFEST_CACHE.mkdir(parents=True, exist_ok=True)
+        stem = Path(coll.archive).stem
+        if (args.out / f"{stem}.manifest.json").resolve() != (MANIFEST_CACHE / f"{stem}.manifest.json").resolve():
+            shutil.copyfile(args.out / f"{stem}.manifest.json", MANIFEST_CACHE / f"{stem}.manifest.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+precache.py - service-worker precache manifest (json/precache-manifest.js).
+
+Lists everything the gallery needs for a repeat or offline visit, each with a
+content revision (first 16 hex digits of its sha256):
+  - the app shell: APP_SHELL pages, css/*.css and js/*.js
+  - the index JSON, categories, favorites, category shards and recent slices
+  - the first FIRST_SCREEN thumbnails of every collection (newest first, the
+    gallery's default order)
+
+sw.js loads the manifest with importScripts(); browsers re-check imported
+scripts on every navigation, so a build that changes any revision installs a
+new worker, which downloads only the entries whose revision changed.
+
+Revisions are not recomputed from scratch: files written by artifacts.py in
+the same process (generate_json.py calls write_manifest() last) reuse the hash
+computed while writing, and all other files reuse the hash stored in the
+catalog as long as their size and mtime are unchanged.
+
+Usage:
+  python precache.py      # rewrite the manifest from the current files
+
+Prints one summary line:
+  PRECACHE_SUMMARY: entries=N bytes=B hashed=H written=0|1 time_ms=...
+"""
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+import json
+import time
+
+from artifacts import file_hash, recorded_hash, write_text_if_changed
+from scan_files import Collection, load_collections
+import catalog
+
+MANIFEST_OUT = Path("json/precache-manifest.js")
+FIRST_SCREEN = 24
+
+APP_SHELL = ["index.html", "mobile.html", "favorites.html"]
+APP_SHELL_GLOBS = ["css/*.css", "js/*.js"]
+DATA_FILES = [Path("json/categories.json"), Path("json/favorites.json")]
+DATA_GLOBS = ["json/shards/**/*.json", "json/recent/*.json"]
+
+
+def precache_paths(conn, collections: List[Collection]) -> List[Path]:
+    paths = [Path(p) for p in APP_SHELL]
+    for pattern in APP_SHELL_GLOBS:
+        paths.extend(sorted(Path(".").glob(pattern)))
+    paths.extend(coll.json_out for coll in collections)
+    paths.extend(DATA_FILES)
+    for pattern in DATA_GLOBS:
+        paths.extend(sorted(Path(".").glob(pattern)))
+    for coll in collections:
+        for row in catalog.iter_recent(conn, coll.name, FIRST_SCREEN):
+            fe, _, _, has_thumb = catalog.row_to_entry(row)
+            if has_thumb:
+                paths.append(catalog.thumb_path(coll, fe.rel))
+    return [p for p in dict.fromkeys(paths) if p.is_file()]
+
+
+def revisions(conn, paths: List[Path]) -> Tuple[Dict[str, Tuple[str, int]], int]:
+    """
+    {url: (sha256, size)} for paths, plus the number of files that had to be read.
+    """
+    cached = catalog.load_hashes(conn)
+    fresh = {}
+    out = {}
+    hashed = 0
+    for p in paths:
+        url = p.as_posix()
+        st = p.stat()
+        digest = recorded_hash(p)
+        if digest is None:
+            old = cached.get(url)
+            if old is not None and old[:2] == (st.st_size, st.st_mtime_ns):
+                digest = old[2]
+            else:
+                digest = file_hash(p)
+                hashed += 1
+        fresh[url] = (st.st_size, st.st_mtime_ns, digest)
+        out[url] = (digest, st.st_size)
+    catalog.save_hashes(conn, fresh)
+    return out, hashed
+
+
+def manifest_text(revs: Dict[str, Tuple[str, int]]) -> str:
+    entries = [{"url": url, "revision": digest[:16]} for url, (digest, _) in revs.items()]
+    return (
+        "// Generated by precache.py - do not edit.\n"
+        "self.__PRECACHE_MANIFEST = " + json.dumps(entries, indent=2, ensure_ascii=False) + ";\n"
+    )
+
+
+def write_manifest(conn, collections: List[Collection]) -> Tuple[bool, dict]:
+    """
+    Write MANIFEST_OUT if any entry or revision changed.
+    Returns (written, {"entries", "bytes", "hashed"}).
+    """
+    revs, hashed = revisions(conn, precache_paths(conn, collections))
+    written = write_text_if_changed(MANIFEST_OUT, manifest_text(revs))
+    return written, {"entries": len(revs), "bytes": sum(size for _, size in revs.values()), "hashed": hashed}
+
+
+def main():
+    t0 = time.perf_counter()
+    conn = catalog.connect()
+    try:
+        written, st = write_manifest(conn, load_collections())
+    finally:
+        conn.close()
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    print(f"PRECACHE_SUMMARY: entries={st['entries']} bytes={st['bytes']} hashed={st['hashed']} "
+          f"written={int(written)} time_ms={elapsed_ms}")
+
+
+if __name__ == "__main__":
+    main()
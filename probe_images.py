@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+probe_images.py - read image format and dimensions from file headers.
+
+probe() parses only the first bytes of a file:
+  - PNG   IHDR chunk
+  - JPEG  first SOFn segment (APPn/EXIF segments are skipped by length)
+  - WEBP  VP8 / VP8L / VP8X chunk
+  - GIF   logical screen descriptor
+  - BMP   DIB header
+Anything else (TIFF, unusual JPEGs) falls back to a lazy Image.open(),
+which also stops after the header. EXIF orientation is not applied, same as
+generate_thumbs.py.
+
+Collections may declare an "orientation" ("landscape" or "portrait") in
+collections.json. Run directly to check every image against the orientation
+of the collection it lives in:
+
+  python probe_images.py           # report misrouted images
+  python probe_images.py --route   # move them into the matching collection (same category path)
+
+and print one summary line:
+  PROBE_SUMMARY: probed=N unknown=U misrouted=M moved=K time_ms=...
+"""
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import os
+import struct
+import sys
+import time
+
+from artifacts import FIRST_SEEN_FILE, load_first_seen, write_json_if_changed
+from scan_files import Collection, FileEntry, load_collections, scan_collections
+
+# Enough for the SOF of nearly every JPEG (EXIF/ICC segments come first)
+HEAD_BYTES = 64 * 1024
+PROBE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Aspect ratios within this factor of 1:1 count as square and fit any collection
+SQUARE_TOLERANCE = 1.1
+
+# JPEG SOFn markers (C4 = DHT, C8 = JPG extension, CC = DAC are not frames)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageInfo(NamedTuple):
+    format: str
+    width: int
+    height: int
+
+
+def _probe_png(head: bytes) -> Optional[ImageInfo]:
+    if len(head) >= 24 and head[12:16] == b"IHDR":
+        w, h = struct.unpack(">II", head[16:24])
+        return ImageInfo("PNG", w, h)
+    return None
+
+
+def _probe_gif(head: bytes) -> Optional[ImageInfo]:
+    if len(head) >= 10:
+        w, h = struct.unpack("<HH", head[6:10])
+        return ImageInfo("GIF", w, h)
+    return None
+
+
+def _probe_bmp(head: bytes) -> Optional[ImageInfo]:
+    if len(head) < 26:
+        return None
+    dib_size = struct.unpack("<I", head[14:18])[0]
+    if dib_size == 12:
+        w, h = struct.unpack("<HH", head[18:22])
+    else:
+        w, h = struct.unpack("<ii", head[18:26])
+    return ImageInfo("BMP", abs(w), abs(h))
+
+
+def _probe_webp(head: bytes) -> Optional[ImageInfo]:
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        # frame tag (3 bytes) + start code 9d 01 2a, then 14-bit width/height
+        if head[23:26] != b"\x9d\x01\x2a":
+            return None
+        w, h = struct.unpack("<HH", head[26:30])
+        return ImageInfo("WEBP", w & 0x3FFF, h & 0x3FFF)
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            return None
+        bits = struct.unpack("<I", head[21:25])[0]
+        return ImageInfo("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        w = int.from_bytes(head[24:27], "little") + 1
+        h = int.from_bytes(head[27:30], "little") + 1
+        return ImageInfo("WEBP", w, h)
+    return None
+
+
+def _probe_jpeg(fh, head: bytes) -> Optional[ImageInfo]:
+    buf = head
+    base = 0  # file offset of buf[0]
+    pos = 2
+    while True:
+        # make sure the marker and segment header are buffered
+        if pos + 9 > len(buf):
+            fh.seek(base + pos)
+            buf = fh.read(HEAD_BYTES)
+            base += pos
+            pos = 0
+            if len(buf) < 9:
+                return None
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in _JPEG_SOF:
+            h, w = struct.unpack(">HH", buf[pos + 5:pos + 9])
+            return ImageInfo("JPEG", w, h)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / start of scan before any frame header
+            return None
+        seg_len = struct.unpack(">H", buf[pos + 2:pos + 4])[0]
+        pos += 2 + seg_len
+
+
+def _probe_pillow(path: str) -> Optional[ImageInfo]:
+    try:
+        # imported lazily: header parsing above covers the common formats
+        from PIL import Image
+
+        with Image.open(path) as im:
+            return ImageInfo(im.format or "", im.size[0], im.size[1])
+    except Exception:
+        return None
+
+
+def probe(path: str) -> Optional[ImageInfo]:
+    """
+    Return ImageInfo(format, width, height) for path, or None if unreadable.
+    """
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(HEAD_BYTES if path.lower().endswith((".jpg", ".jpeg")) else 32)
+            info = None
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                info = _probe_png(head)
+            elif head[:3] == b"\xff\xd8\xff":
+                info = _probe_jpeg(fh, head)
+            elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                info = _probe_webp(head)
+            elif head[:6] in (b"GIF87a", b"GIF89a"):
+                info = _probe_gif(head)
+            elif head[:2] == b"BM":
+                info = _probe_bmp(head)
+    except (OSError, struct.error, IndexError):
+        info = None
+    if info is not None and info.width > 0 and info.height > 0:
+        return info
+    if path.lower().endswith(".svg"):
+        return None
+    return _probe_pillow(path)
+
+
+def probe_table(table: List[FileEntry], max_workers: int = PROBE_WORKERS) -> Dict[str, Optional[ImageInfo]]:
+    """
+    Probe every file of a file table in parallel; returns {FileEntry.path: ImageInfo or None}.
+    """
+    paths = [fe.path for fe in table]
+    if len(paths) < 64:
+        return {p: probe(p) for p in paths}
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(probe, paths)))
+
+
+def orientation_of(info: Optional[ImageInfo]) -> str:
+    """
+    "landscape", "portrait" or "" (near-square or unknown - fits any collection).
+    """
+    if info is None:
+        return ""
+    ratio = info.width / info.height
+    if 1 / SQUARE_TOLERANCE <= ratio <= SQUARE_TOLERANCE:
+        return ""
+    return "landscape" if ratio > 1 else "portrait"
+
+
+def find_misrouted(collections: List[Collection], tables: Dict[str, List[FileEntry]],
+                   infos: Dict[str, Optional[ImageInfo]]) -> List[Tuple[Collection, FileEntry, Collection]]:
+    """
+    Return (current collection, file, target collection) for every image whose
+    aspect ratio contradicts its collection's orientation and for which another
+    collection with the matching orientation exists.
+    """
+    by_orientation = {}
+    for coll in collections:
+        if coll.orientation:
+            by_orientation.setdefault(coll.orientation, coll)
+
+    out = []
+    for coll in collections:
+        if not coll.orientation:
+            continue
+        for fe in tables.get(coll.name, []):
+            actual = orientation_of(infos.get(fe.path))
+            if actual and actual != coll.orientation and actual in by_orientation:
+                out.append((coll, fe, by_orientation[actual]))
+    return out
+
+
+def route(moves: List[Tuple[Collection, FileEntry, Collection]]) -> int:
+    """
+    Move misrouted files into their target collection, keeping the category path.
+    Existing destination files are never overwritten. The thumbnail made for
+    the old collection is removed (the target collection uses another size and
+    generate_thumbs.py recreates it), and the file's json/first_seen.json stamp
+    moves to the new path so it does not show up as newly added.
+    Returns number moved.
+    """
+    first_seen = load_first_seen()
+    moved = 0
+    for coll, fe, target in moves:
+        dst = target.src / fe.rel
+        if dst.exists():
+            print(f"Warning: not moving {fe.path}: {dst} already exists", file=sys.stderr)
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(fe.path, dst)
+        moved += 1
+
+        old_thumb = coll.thumb_root / Path(fe.rel).with_suffix(".webp")
+        old_thumb.unlink(missing_ok=True)
+        if first_seen is not None:
+            stamp = first_seen.pop(Path(fe.path).as_posix(), None)
+            if stamp is not None:
+                first_seen[dst.as_posix()] = stamp
+
+    if moved and first_seen is not None:
+        write_json_if_changed(FIRST_SEEN_FILE, dict(sorted(first_seen.items())))
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe wallpaper dimensions and check collection orientation.")
+    parser.add_argument("--route", action="store_true", help="Move misrouted images into the collection matching their orientation.")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    collections = load_collections()
+    tables = scan_collections(collections)
+    infos = {}
+    for table in tables.values():
+        infos.update(probe_table(table))
+
+    moves = find_misrouted(collections, tables, infos)
+    for coll, fe, target in moves:
+        info = infos[fe.path]
+        print(f"{fe.path}: {info.width}x{info.height} belongs in {target.name} ({target.src.as_posix()}/)")
+    moved = route(moves) if args.route else 0
+
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    unknown = sum(1 for v in infos.values() if v is None)
+    print(f"PROBE_SUMMARY: probed={len(infos)} unknown={unknown} misrouted={len(moves)} moved={moved} time_ms={elapsed_ms}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+scan_files.py - config-driven, parallel directory scanner shared by the build stages.
+
+Collections are read from collections.json (falls back to the built-in
+desktop/mobile pair when the file is missing), along with the optional
+"site_url" the gallery is published under (load_site_url()). Each collection is walked
+recursively with os.scandir, to any depth (symlinked folders are followed, each
+target once), and flattened into one file table of image files (IMAGE_EXTS):
+
+  FileEntry(rel, path, size, mtime, category)
+
+  - rel       POSIX path relative to the collection's source root
+  - path      path on disk (src root joined with rel)
+  - category  parent folders of rel joined with "/" ("uncategorized" for root files)
+
+Walkers run in a thread pool, one task per top-level directory of every
+collection, so a large category does not serialize the rest of the scan
+(max_workers=1 walks sequentially without starting any threads).
+Ordering is deterministic: inside every directory, files come first (sorted
+case-insensitively), then subdirectories (same ordering).
+
+fingerprint() digests file tables plus the size/mtime of extra files; build
+stages compare it with the one cached by the previous run to skip no-op work.
+
+Run directly to print one summary line:
+  SCAN_SUMMARY: collections=N files=M time_ms=...
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+import hashlib
+import json
+import os
+import time
+
+COLLECTIONS_FILE = Path("collections.json")
+
+# Known image extensions (we index GIFs too; thumbnails for GIFs are not used)
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tiff", ".svg"}
+
+# Raster extensions we WILL create thumbnails for (GIF intentionally excluded)
+RASTER_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tiff"}
+
+DEFAULT_COLLECTIONS = [
+    {
+        "name": "desktop",
+        "src": "wallpapers",
+        "json": "json/wallpapers.json",
+        "thumbs": "thumbnail/wallpapers-thumb",
+        "max_size": [640, 360],
+        "orientation": "landscape",
+        "archive": "wallpaper-all.zip",
+    },
+    {
+        "name": "mobile",
+        "src": "wallpapers-mobile",
+        "json": "json/wallpapers-mobile.json",
+        "thumbs": "thumbnail/mobile-wallpapers-thumb",
+        "max_size": [540, 960],
+        "orientation": "portrait",
+        "archive": "wallpaper-mobile-all.zip",
+    },
+]
+
+# Public URL of the gallery, used for absolute links (Atom feeds)
+DEFAULT_SITE_URL = "https://fahim-foysal-097.github.io/wallpapers/"
+
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+class Collection(NamedTuple):
+    name: str
+    src: Path
+    json_out: Path
+    thumb_root: Path
+    max_size: Tuple[int, int]
+    orientation: str = ""  # "landscape", "portrait" or "" (any); see probe_images.py
+    archive: str = ""  # release zip name; see make_archives.py
+
+
+class FileEntry(NamedTuple):
+    rel: str
+    path: str
+    size: int
+    mtime: float
+    category: str
+
+
+def load_collections(path: Path = COLLECTIONS_FILE) -> List[Collection]:
+    """
+    Load the collection list from collections.json, or the defaults if absent.
+    """
+    raw = DEFAULT_COLLECTIONS
+    if path.exists():
+        with path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        raw = data.get("collections", []) if isinstance(data, dict) else data
+
+    out = []
+    for c in raw:
+        out.append(Collection(
+            name=c["name"],
+            src=Path(c["src"]),
+            json_out=Path(c["json"]),
+            thumb_root=Path(c["thumbs"]),
+            max_size=tuple(c.get("max_size", (640, 360))),
+            orientation=c.get("orientation", ""),
+            archive=c.get("archive", ""),
+        ))
+    return out
+
+
+def load_site_url(path: Path = COLLECTIONS_FILE) -> str:
+    """
+    The "site_url" from collections.json (with a trailing "/"), or DEFAULT_SITE_URL.
+    """
+    url = DEFAULT_SITE_URL
+    if path.exists():
+        with path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if isinstance(data, dict) and data.get("site_url"):
+            url = data["site_url"]
+    return url if url.endswith("/") else url + "/"
+
+
+def _sorted_entries(dir_path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+    files = []
+    dirs = []
+    exts = IMAGE_EXTS
+    try:
+        with os.scandir(dir_path) as it:
+            for de in it:
+                try:
+                    # symlinked category folders are followed (walk_dir guards against loops)
+                    if de.is_dir():
+                        dirs.append(de)
+                        continue
+                    # cheaper than os.path.splitext; leading dots are not extensions
+                    name = de.name
+                    dot = name.rfind(".")
+                    if dot > 0 and name[dot:].lower() in exts and de.is_file():
+                        files.append(de)
+                except OSError:
+                    continue
+    except OSError:
+        return [], []
+    files.sort(key=lambda d: d.name.lower())
+    dirs.sort(key=lambda d: d.name.lower())
+    return files, dirs
+
+
+def walk_dir(dir_path: str, rel_dir: str) -> List[FileEntry]:
+    """
+    Recursively walk dir_path (whose path relative to the collection root is
+    rel_dir, "" for the root itself) and return its flat file table.
+    Symlinked directories are followed, each target at most once.
+    """
+    out: List[FileEntry] = []
+    append = out.append
+    seen = set()  # (st_dev, st_ino) of the start and of every symlinked directory entered
+    try:
+        st = os.stat(dir_path)
+        seen.add((st.st_dev, st.st_ino))
+    except OSError:
+        pass
+    stack = [(dir_path, rel_dir)]
+    while stack:
+        cur, rel = stack.pop()
+        files, dirs = _sorted_entries(cur)
+        category = rel or "uncategorized"
+        prefix = rel + "/" if rel else ""
+        for de in files:
+            try:
+                st = de.stat()
+            except OSError:
+                continue
+            # positional construction: this loop runs once per file
+            append(FileEntry(prefix + de.name, de.path, st.st_size, st.st_mtime, category))
+        # push in reverse so subdirectories are emitted in sorted order
+        for de in reversed(dirs):
+            if de.is_symlink():
+                try:
+                    st = de.stat()
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+            stack.append((de.path, f"{rel}/{de.name}" if rel else de.name))
+    return out
+
+
+def scan_collections(collections: List[Collection] = None, max_workers: int = MAX_WORKERS) -> Dict[str, List[FileEntry]]:
+    """
+    Scan every collection in parallel and return {collection name: file table}.
+    """
+    if collections is None:
+        collections = load_collections()
+    if max_workers <= 1:
+        return {c.name: walk_dir(str(c.src), "") if c.src.is_dir() else [] for c in collections}
+
+    # imported here: the sequential path above must not pay for it
+    from concurrent.futures import ThreadPoolExecutor
+
+    plan = []  # (collection name, root files, [futures for top-level dirs])
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for coll in collections:
+            src = str(coll.src)
+            if not coll.src.is_dir():
+                plan.append((coll.name, [], []))
+                continue
+            files, dirs = _sorted_entries(src)
+            root_future = pool.submit(_stat_root_files, files)
+            dir_futures = [pool.submit(walk_dir, de.path, de.name) for de in dirs]
+            plan.append((coll.name, [root_future], dir_futures))
+
+        tables = {}
+        for name, root_futures, dir_futures in plan:
+            table: List[FileEntry] = []
+            for fut in root_futures:
+                table.extend(fut.result())
+            for fut in dir_futures:
+                table.extend(fut.result())
+            tables[name] = table
+    return tables
+
+
+def _stat_root_files(files: List[os.DirEntry]) -> List[FileEntry]:
+    out = []
+    for de in files:
+        try:
+            st = de.stat()
+        except OSError:
+            continue
+        out.append(FileEntry(rel=de.name, path=de.path, size=st.st_size, mtime=st.st_mtime, category="uncategorized"))
+    return out
+
+
+def fingerprint(tables: Dict[str, List[FileEntry]], paths: Iterable[Path] = ()) -> str:
+    """
+    Digest of every (rel, size, mtime) in tables plus size/mtime of paths
+    (missing paths count too). Equal digests mean nothing was added, removed
+    or modified.
+    """
+    fp = hashlib.blake2b(digest_size=16)
+    for name in sorted(tables):
+        fp.update(name.encode("utf-8") + b"\n")
+        for fe in tables[name]:
+            fp.update(f"{fe.rel}\0{fe.size}\0{fe.mtime}\n".encode("utf-8"))
+    for p in paths:
+        try:
+            st = os.stat(p)
+            fp.update(f"{p}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+        except OSError:
+            fp.update(f"{p}\0-\n".encode("utf-8"))
+    return fp.hexdigest()
+
+
+def main():
+    t0 = time.perf_counter()
+    collections = load_collections()
+    tables = scan_collections(collections)
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    files = sum(len(t) for t in tables.values())
+    print(f"SCAN_SUMMARY: collections={len(collections)} files={files} time_ms={elapsed_ms}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+serve.py - local preview server for the gallery.
+
+Serves the static site from the repository root without running the full
+build first:
+
+  - Thumbnails under thumbnail/ are generated lazily on the first request
+    (same settings as generate_thumbs.make_thumb) when missing or older than
+    their source. Fresh thumbnails go into a bounded in-memory LRU and are
+    then written to disk. Concurrent requests for the same thumbnail share
+    one encode (request coalescing).
+  - The collection index JSON files and json/categories.json are generated
+    in memory from the current source trees and regenerated when a rescan
+    sees a change (polled every --poll seconds).
+  - JSON responses are gzip-compressed once and served precompressed to
+    clients that send Accept-Encoding: gzip.
+  - Every response carries an ETag; If-None-Match is answered with 304.
+  - sw.js is answered with DEV_SERVICE_WORKER, which deletes the offline
+    caches and unregisters itself: the real worker serves the precached
+    index JSON cache-first and would hide the live regeneration.
+
+Usage:
+  python serve.py                       # http://127.0.0.1:8000/
+  python serve.py --port 9000 --cache-mb 128 --poll 1
+"""
+
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from artifacts import load_first_seen
+from probe_images import probe_table
+from scan_files import RASTER_EXTS, fingerprint, load_collections, scan_collections
+import generate_json
+
+ROOT = Path(__file__).parent.resolve()
+
+DEFAULT_CACHE_MB = 64
+DEFAULT_POLL_S = 2.0
+
+DEV_SERVICE_WORKER = b"""// serve.py preview: no offline caching; drop caches and this registration.
+self.addEventListener("install", () => self.skipWaiting());
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    (async () => {
+      for (const key of await caches.keys()) await caches.delete(key);
+      await self.registration.unregister();
+    })()
+  );
+});
+"""
+
+
+class LRUCache:
+    """
+    Thread-safe LRU of bytes values bounded by total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._data: "OrderedDict[object, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is not None:
+                self._data.move_to_end(key)
+            return val
+
+    def put(self, key, val: bytes) -> None:
+        if len(val) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total -= len(old)
+            self._data[key] = val
+            self.total += len(val)
+            while self.total > self.max_bytes:
+                _, dropped = self._data.popitem(last=False)
+                self.total -= len(dropped)
+
+
+class Coalescer:
+    """
+    Run fn once per key at a time; concurrent callers with the same key wait
+    for and share the leader's result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[object, Future] = {}
+
+    def run(self, key, fn):
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[key] = fut
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def make_etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+def stat_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+class SiteState:
+    """
+    In-memory view of the collections: generated index payloads and the
+    thumbnail -> source lookup, rebuilt whenever the scanned tree changes.
+    """
+
+    def __init__(self):
+        self.collections = load_collections()
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        # url path ("json/wallpapers.json") -> (raw bytes, gzip bytes, etag)
+        self.payloads: Dict[str, Tuple[bytes, bytes, str]] = {}
+        # thumbnail url path -> (source path, src mtime, max_size)
+        self.thumb_sources: Dict[str, Tuple[str, float, Tuple[int, int]]] = {}
+        self.json_gz = LRUCache(8 * 1024 * 1024)
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Rescan the source trees; rebuild payloads if anything changed.
+        Returns True when a rebuild happened.
+        """
+        tables = scan_collections(self.collections)
+        digest = fingerprint(tables)
+        if digest == self.fingerprint:
+            return False
+
+        payloads = {}
+        thumb_sources = {}
+        categories = {}
+        # read-only: new files fall back to their mtime until the next build stamps them
+        first_seen = load_first_seen()
+        for coll in self.collections:
+            table = tables.get(coll.name, [])
+            entries, counts = generate_json.build_entries(coll, table, lazy_thumbs=True, infos=probe_table(table),
+                                                          first_seen=first_seen)
+            payloads[coll.json_out.as_posix()] = encode_json(generate_json.index_payload(entries))
+            categories[coll.name] = generate_json.category_array(counts)
+            for fe in table:
+                rel = Path(fe.rel)
+                if rel.suffix.lower() in RASTER_EXTS:
+                    url = coll.thumb_root.joinpath(rel.with_suffix(".webp")).as_posix()
+                    thumb_sources[url] = (fe.path, fe.mtime, coll.max_size)
+        payloads[generate_json.CATEGORIES_OUT.as_posix()] = encode_json(categories)
+
+        with self.lock:
+            self.payloads = payloads
+            self.thumb_sources = thumb_sources
+            self.fingerprint = digest
+        return True
+
+
+def encode_json(obj) -> Tuple[bytes, bytes, str]:
+    raw = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return raw, gzip.compress(raw, compresslevel=9, mtime=0), make_etag(raw)
+
+
+def watch_loop(state: SiteState, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            if state.refresh():
+                print(f"[{datetime.now(timezone.utc).isoformat()}] source change detected - index regenerated", flush=True)
+        except Exception as e:
+            print(f"Warning: rescan failed: {e}", file=sys.stderr, flush=True)
+
+
+class GalleryHandler(SimpleHTTPRequestHandler):
+    state: SiteState = None
+    thumbs: LRUCache = None
+    coalescer: Coalescer = None
+
+    _etag: Optional[str] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(ROOT), **kwargs)
+
+    def log_message(self, format, *args):
+        # keep the console quiet apart from errors
+        pass
+
+    def end_headers(self):
+        if self._etag:
+            self.send_header("ETag", self._etag)
+            self.send_header("Cache-Control", "no-cache")
+        super().end_headers()
+
+    def _not_modified(self, etag: str) -> bool:
+        inm = self.headers.get("If-None-Match")
+        if not inm:
+            return False
+        tags = [t.strip() for t in inm.split(",")]
+        if etag in tags or "*" in tags:
+            self._etag = etag
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.end_headers()
+            return True
+        return False
+
+    def _send_bytes(self, data: bytes, ctype: str, etag: str, gz: Optional[bytes] = None, head: bool = False):
+        if self._not_modified(etag):
+            return
+        body = data
+        self._etag = etag
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", ctype)
+        if gz is not None:
+            self.send_header("Vary", "Accept-Encoding")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gz
+                self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def do_GET(self):
+        self._dispatch(head=False)
+
+    def _dispatch(self, head: bool):
+        self._etag = None
+        url_path = unquote(urlsplit(self.path).path).lstrip("/")
+
+        payload = self.state.payloads.get(url_path)
+        if payload is not None:
+            raw, gz, etag = payload
+            return self._send_bytes(raw, "application/json; charset=utf-8", etag, gz, head)
+
+        if url_path == "sw.js":
+            return self._send_bytes(DEV_SERVICE_WORKER, "text/javascript; charset=utf-8",
+                                    make_etag(DEV_SERVICE_WORKER), None, head)
+
+        src = self.state.thumb_sources.get(url_path)
+        if src is not None:
+            data = self._thumbnail(url_path, src)
+            if data is not None:
+                return self._send_bytes(data, "image/webp", make_etag(data), None, head)
+
+        fs_path = Path(self.translate_path(self.path))
+        try:
+            st = fs_path.stat()
+        except OSError:
+            st = None
+        if st is not None and fs_path.is_file():
+            if fs_path.suffix.lower() == ".json":
+                return self._send_static_json(fs_path, st, head)
+            etag = stat_etag(st)
+            if self._not_modified(etag):
+                return
+            self._etag = etag
+
+        if head:
+            return super().do_HEAD()
+        return super().do_GET()
+
+    def _send_static_json(self, fs_path: Path, st: os.stat_result, head: bool):
+        key = (str(fs_path), st.st_mtime_ns, st.st_size)
+        etag = stat_etag(st)
+        if self._not_modified(etag):
+            return
+        raw = fs_path.read_bytes()
+        gz = self.state.json_gz.get(key)
+        if gz is None:
+            gz = gzip.compress(raw, compresslevel=9, mtime=0)
+            self.state.json_gz.put(key, gz)
+        self._send_bytes(raw, "application/json; charset=utf-8", etag, gz, head)
+
+    def _thumbnail(self, url_path: str, src) -> Optional[bytes]:
+        """
+        Return thumbnail bytes when it has to be (or was recently) generated,
+        or None to let the static handler serve the up-to-date file on disk.
+        """
+        src_path, src_mtime, max_size = src
+        key = (url_path, src_mtime)
+        cached = self.thumbs.get(key)
+        if cached is not None:
+            return cached
+
+        dst = ROOT / url_path
+        try:
+            if dst.stat().st_mtime >= src_mtime:
+                return None
+        except OSError:
+            pass
+
+        def generate() -> bytes:
+            # imported lazily: the rest of the server does not need Pillow
+            from generate_thumbs import encode_thumb
+
+            data = encode_thumb(Path(src_path), max_size)
+            self.thumbs.put(key, data)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(dst.name + f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(dst)
+            return data
+
+        try:
+            return self.coalescer.run(key, generate)
+        except Exception as e:
+            print(f"Warning: thumbnail failed for {src_path}: {e}", file=sys.stderr, flush=True)
+            return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the gallery locally with on-demand thumbnails.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000, help="Port (default 8000).")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB, help=f"Thumbnail LRU size in MB (default {DEFAULT_CACHE_MB}).")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_S, help=f"Seconds between source rescans (default {DEFAULT_POLL_S}).")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    GalleryHandler.state = SiteState()
+    GalleryHandler.thumbs = LRUCache(args.cache_mb * 1024 * 1024)
+    GalleryHandler.coalescer = Coalescer()
+
+    threading.Thread(target=watch_loop, args=(GalleryHandler.state, args.poll), daemon=True).start()
+
+    httpd = ThreadingHTTPServer((args.host, args.port), GalleryHandler)
+    print(f"Serving gallery on http://{args.host}:{args.port}/ (Ctrl+C to stop)", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
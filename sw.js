@@ -0,0 +1,119 @@
+/*
+ * Service worker: precache + offline support for the gallery.
+ *
+ * json/precache-manifest.js (generated by precache.py) lists the app shell,
+ * index JSON and first-screen thumbnails with content revisions. Entries are
+ * cached under "<url>?__rev=<revision>", so a new build only downloads the
+ * entries whose revision changed; everything else is reused from the cache.
+ *
+ * - precached URLs: cache first (the manifest says they are current)
+ * - other thumbnails: stale-while-revalidate, keeping at most
+ *   RUNTIME_MAX_ENTRIES of them (oldest dropped first)
+ * - everything else: network, falling back to the cache when offline
+ *
+ * serve.py answers sw.js with a worker that unregisters itself, so local
+ * previews always see the live index.
+ */
+importScripts("json/precache-manifest.js");
+
+const PRECACHE = "precache-v1";
+const RUNTIME = "runtime-v1";
+const RUNTIME_MAX_ENTRIES = 200;
+const MANIFEST = self.__PRECACHE_MANIFEST || [];
+
+const scopeUrl = (path) => new URL(path, self.registration.scope).href;
+const cacheKey = (entry) =>
+  scopeUrl(`${entry.url}?__rev=${encodeURIComponent(entry.revision)}`);
+
+// absolute URL -> revisioned cache key
+const PRECACHED = new Map(MANIFEST.map((e) => [scopeUrl(e.url), cacheKey(e)]));
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    (async () => {
+      const cache = await caches.open(PRECACHE);
+      await Promise.all(
+        MANIFEST.map(async (entry) => {
+          const key = cacheKey(entry);
+          if (await cache.match(key)) return;
+          const resp = await fetch(scopeUrl(entry.url), { cache: "no-cache" });
+          // a missing entry fails the install: the previous worker (and its
+          // cache) stays in control until a complete deploy is reachable
+          if (!resp.ok) throw new Error(`precache ${entry.url}: HTTP ${resp.status}`);
+          await cache.put(key, resp);
+        })
+      );
+      await self.skipWaiting();
+    })()
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    (async () => {
+      const keep = new Set(PRECACHED.values());
+      const cache = await caches.open(PRECACHE);
+      for (const req of await cache.keys()) {
+        if (!keep.has(req.url)) await cache.delete(req);
+      }
+      await self.clients.claim();
+    })()
+  );
+});
+
+// cache.keys() lists entries in insertion order; drop the oldest beyond the cap
+async function trimCache(cache, maxEntries) {
+  const keys = await cache.keys();
+  for (const req of keys.slice(0, Math.max(0, keys.length - maxEntries))) {
+    await cache.delete(req);
+  }
+}
+
+async function staleWhileRevalidate(request) {
+  const cache = await caches.open(RUNTIME);
+  const cached = await cache.match(request);
+  const network = fetch(request)
+    .then(async (resp) => {
+      if (resp.ok) {
+        await cache.put(request, resp.clone());
+        await trimCache(cache, RUNTIME_MAX_ENTRIES);
+      }
+      return resp;
+    })
+    .catch(() => cached);
+  return cached || network;
+}
+
+async function networkFallingBack(request) {
+  try {
+    return await fetch(request);
+  } catch (err) {
+    const cached = await caches.match(request, { ignoreSearch: true });
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  let key = PRECACHED.get(url.origin + url.pathname);
+  if (!key && request.mode === "navigate" && url.href.startsWith(self.registration.scope)) {
+    // the site root serves index.html
+    if (url.pathname.endsWith("/")) key = PRECACHED.get(scopeUrl("index.html"));
+  }
+  if (key) {
+    event.respondWith(
+      caches.match(key).then((cached) => cached || networkFallingBack(request))
+    );
+    return;
+  }
+  if (url.pathname.includes("/thumbnail/")) {
+    event.respondWith(staleWhileRevalidate(request));
+    return;
+  }
+  event.respondWith(networkFallingBack(request));
+});
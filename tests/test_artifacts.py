@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+import artifacts
+from scan_files import FileEntry
+
+
+@pytest.fixture(autouse=True)
+def no_recorded_hashes():
+    artifacts.forget_hashes()
+    yield
+    artifacts.forget_hashes()
+
+
+def test_write_text_if_changed(tmp_path):
+    path = tmp_path / "out" / "a.txt"
+    assert artifacts.write_text_if_changed(path, "one") is True
+    os.utime(path, (0, 0))
+    assert artifacts.write_text_if_changed(path, "one") is False
+    assert path.stat().st_mtime == 0  # identical content is not rewritten
+    assert artifacts.write_text_if_changed(path, "two") is True
+    assert path.read_text(encoding="utf-8") == "two"
+    assert artifacts.recorded_hash(path) == artifacts.content_hash(b"two")
+    assert not path.with_name("a.txt.tmp").exists()
+
+
+def test_write_json_if_changed_keeps_stamp(tmp_path):
+    path = tmp_path / "index.json"
+    assert artifacts.write_json_if_changed(path, {"generated_at": "old", "count": 1}, stamp_key="generated_at")
+    # only the stamp differs: the file on disk (and its stamp) stays
+    assert not artifacts.write_json_if_changed(path, {"generated_at": "new", "count": 1}, stamp_key="generated_at")
+    assert artifacts.read_stamp(path) == "old"
+    # anything else changed: the new stamp is written
+    assert artifacts.write_json_if_changed(path, {"generated_at": "new", "count": 2}, stamp_key="generated_at")
+    assert artifacts.read_stamp(path) == "new"
+
+
+def test_write_json_if_changed_without_stamp_key(tmp_path):
+    path = tmp_path / "a.json"
+    artifacts.write_json_if_changed(path, {"generated_at": "old"})
+    assert artifacts.write_json_if_changed(path, {"generated_at": "new"})
+    assert path.read_text(encoding="utf-8") == artifacts.dump_json({"generated_at": "new"})
+
+
+def test_write_stream_if_changed(tmp_path):
+    path = tmp_path / "stream.json"
+    assert artifacts.write_stream_if_changed(path, '{"generated_at": "old",', iter(['"n": 1', "}"]))
+    assert path.read_text(encoding="utf-8") == '{"generated_at": "old","n": 1}'
+
+    # same body, new head: kept_head (the head already on disk) matches, nothing is written
+    kept = artifacts.read_stamp(path)
+    assert not artifacts.write_stream_if_changed(path, '{"generated_at": "new",', iter(['"n": 1', "}"]),
+                                                 kept_head=f'{{"generated_at": "{kept}",')
+    assert artifacts.read_stamp(path) == "old"
+    assert artifacts.recorded_hash(path) == artifacts.file_hash(path)
+
+    assert artifacts.write_stream_if_changed(path, '{"generated_at": "new",', iter(['"n": 2', "}"]),
+                                             kept_head='{"generated_at": "old",')
+    assert path.read_text(encoding="utf-8") == '{"generated_at": "new","n": 2}'
+    assert artifacts.recorded_hash(path) == artifacts.file_hash(path)
+    assert not path.with_name("stream.json.tmp").exists()
+
+
+def test_update_first_seen():
+    tables = {"desktop": [FileEntry("a.png", "wallpapers/a.png", 1, 0.0, "uncategorized"),
+                          FileEntry("b.png", "wallpapers/b.png", 1, 0.0, "uncategorized")]}
+    # no manifest yet: files are stamped with their mtime
+    manifest, added = artifacts.update_first_seen(tables, None)
+    assert manifest == {"wallpapers/a.png": "1970-01-01T00:00:00+00:00", "wallpapers/b.png": "1970-01-01T00:00:00+00:00"}
+    assert added == 2
+    # known files keep their stamp, new ones get the current time, removed ones are dropped
+    previous = {"wallpapers/a.png": "2025-01-01T00:00:00+00:00", "wallpapers/gone.png": "2025-01-01T00:00:00+00:00"}
+    before = artifacts.iso_seconds(time.time())
+    manifest, added = artifacts.update_first_seen(tables, previous)
+    assert list(manifest) == ["wallpapers/a.png", "wallpapers/b.png"]
+    assert manifest["wallpapers/a.png"] == "2025-01-01T00:00:00+00:00"
+    assert manifest["wallpapers/b.png"] >= before
+    assert added == 1
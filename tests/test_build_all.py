@@ -0,0 +1,58 @@
+import sys
+
+import pytest
+
+import artifacts
+import build_all
+
+FAILING_STAGE = '''
+def main(argv=None, tables=None):
+    print("starting")
+    raise RuntimeError("boom")
+'''
+
+
+@pytest.fixture
+def failing_stage(tmp_path, monkeypatch):
+    script = tmp_path / "failing_stage.py"
+    script.write_text(FAILING_STAGE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield script
+    sys.modules.pop("failing_stage", None)
+
+
+def test_run_stage_reports_exception(failing_stage):
+    result = build_all.run_stage(failing_stage)
+    assert result.returncode == 1
+    assert result.error == "RuntimeError: boom"
+    assert result.stdout == "starting\n"
+    assert "Traceback" in result.stderr and "RuntimeError: boom" in result.stderr
+
+
+def test_run_stage_exit_message(tmp_path, monkeypatch):
+    script = tmp_path / "exiting_stage.py"
+    script.write_text("import sys\n\ndef main(argv=None):\n    sys.exit('bad input')\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        result = build_all.run_stage(script)
+    finally:
+        sys.modules.pop("exiting_stage", None)
+    assert (result.returncode, result.stderr, result.error) == (1, "bad input\n", "")
+
+
+def test_run_stage_forgets_recorded_hashes(failing_stage, tmp_path):
+    artifacts.write_text_if_changed(tmp_path / "a.txt", "a")
+    assert artifacts.recorded_hash(tmp_path / "a.txt") is not None
+    build_all.run_stage(failing_stage)
+    assert artifacts.recorded_hash(tmp_path / "a.txt") is None
+
+
+def test_failing_stage_fails_build(failing_stage, monkeypatch, capsys):
+    monkeypatch.chdir(build_all.ROOT)
+    monkeypatch.setattr(build_all, "SCRIPTS", [failing_stage])
+    with pytest.raises(SystemExit) as exc:
+        build_all.main(["--force", "--budgets", "off"])
+    assert exc.value.code == 1
+    out = capsys.readouterr().out
+    assert "ERROR in failing_stage.py" in out
+    assert "failing_stage.py raised RuntimeError: boom" in out
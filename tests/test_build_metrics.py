@@ -0,0 +1,42 @@
+import build_metrics
+
+
+def test_percentile():
+    assert build_metrics.percentile([], 95) == 0
+    values = list(range(1, 101))
+    assert build_metrics.percentile(values, 50) == 50
+    assert build_metrics.percentile(values, 95) == 95
+    assert build_metrics.percentile(values, 100) == 100
+    assert build_metrics.percentile([7], 95) == 7
+
+
+def test_check_budgets():
+    flat = {"gzip_bytes:json/wallpapers.json": 40000, "thumb_p95_bytes": 1000}
+    limits = {
+        "gzip_bytes:json/wallpapers.json": 30720,
+        "thumb_p95_bytes": 61440,
+        "gzip_bytes:json/not-built.json": 1,
+    }
+    # only exceeded limits are reported; metrics the build did not produce are skipped
+    assert build_metrics.check_budgets(flat, limits) == [("gzip_bytes:json/wallpapers.json", 40000, 30720)]
+
+
+def test_check_budgets_at_limit():
+    assert build_metrics.check_budgets({"thumb_p95_bytes": 100}, {"thumb_p95_bytes": 100}) == []
+
+
+def test_find_regressions():
+    previous = {"gzip_bytes:json/a.json": 1000, "thumb_p95_bytes": 1000, "total_time_ms": 10}
+    flat = {"gzip_bytes:json/a.json": 1200, "thumb_p95_bytes": 1050, "total_time_ms": 100,
+            "outputs_bytes:json/shards": 5000}
+    # timings and metrics without a previous value are never regressions
+    assert build_metrics.find_regressions(flat, previous, 10) == [("gzip_bytes:json/a.json", 1000, 1200)]
+
+
+def test_artifact_paths_follow_collections():
+    from scan_files import load_collections
+
+    collections = load_collections()
+    paths = build_metrics.artifact_paths(collections)
+    assert paths[:len(collections)] == [coll.json_out for coll in collections]
+    assert paths[len(collections):] == build_metrics.SITE_ARTIFACTS
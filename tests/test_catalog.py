@@ -0,0 +1,79 @@
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+import catalog
+from scan_files import Collection, scan_collections
+
+FIRST_SEEN = {
+    "wallpapers/nature/a.png": "2025-01-05T00:00:00+00:00",
+    "wallpapers/nature/b.png": "2025-02-05T00:00:00+00:00",
+}
+
+
+def png(w, h):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    src = Path("wallpapers/nature")
+    src.mkdir(parents=True)
+    (src / "a.png").write_bytes(png(1920, 1080))
+    (src / "b.png").write_bytes(png(2560, 1440))
+    coll = Collection("desktop", Path("wallpapers"), Path("json/wallpapers.json"), Path("thumbnails"), (400, 250))
+    conn = catalog.connect(tmp_path / "catalog.sqlite3")
+    yield conn, [coll]
+    conn.close()
+
+
+def sync(conn, collections):
+    return catalog.sync(conn, collections, scan_collections(collections, max_workers=1), FIRST_SEEN)
+
+
+def test_sync_inserts_and_marks_groups_dirty(tree):
+    conn, collections = tree
+    assert sync(conn, collections) == {"inserted": 2, "updated": 0, "deleted": 0, "touched": 0}
+    assert sorted(catalog.dirty_groups(conn, "desktop")) == [("nature", "2025-01"), ("nature", "2025-02")]
+    assert catalog.count(conn, "desktop") == 2
+    fmt, width, height = conn.execute("SELECT format, width, height FROM files WHERE rel = 'nature/a.png'").fetchone()
+    assert (fmt, width, height) == ("PNG", 1920, 1080)
+
+
+def test_sync_unchanged_tree_is_clean(tree):
+    conn, collections = tree
+    sync(conn, collections)
+    catalog.clear_dirty(conn, "desktop")
+    assert sync(conn, collections) == {"inserted": 0, "updated": 0, "deleted": 0, "touched": 0}
+    assert catalog.dirty_groups(conn, "desktop") == []
+
+
+def test_sync_touched_file_is_not_dirty(tree):
+    conn, collections = tree
+    sync(conn, collections)
+    catalog.clear_dirty(conn, "desktop")
+    path = "wallpapers/nature/a.png"
+    exported = conn.execute("SELECT mtime FROM files WHERE path = ?", (path,)).fetchone()[0]
+    os.utime(path, (exported + 3600, exported + 3600))
+
+    assert sync(conn, collections) == {"inserted": 0, "updated": 0, "deleted": 0, "touched": 1}
+    assert catalog.dirty_groups(conn, "desktop") == []
+    # the exported mtime stays; only the mtime the next scan compares against moves
+    mtime, scan_mtime = conn.execute("SELECT mtime, scan_mtime FROM files WHERE path = ?", (path,)).fetchone()
+    assert (mtime, scan_mtime) == (exported, exported + 3600)
+    assert sync(conn, collections)["touched"] == 0
+
+
+def test_sync_changed_and_removed_files(tree):
+    conn, collections = tree
+    sync(conn, collections)
+    catalog.clear_dirty(conn, "desktop")
+    Path("wallpapers/nature/a.png").write_bytes(png(1080, 1920) + b"\x00")
+    Path("wallpapers/nature/b.png").unlink()
+
+    assert sync(conn, collections) == {"inserted": 0, "updated": 1, "deleted": 1, "touched": 0}
+    assert sorted(catalog.dirty_groups(conn, "desktop")) == [("nature", "2025-01"), ("nature", "2025-02")]
+    assert conn.execute("SELECT width, height FROM files WHERE rel = 'nature/a.png'").fetchone() == (1080, 1920)
@@ -0,0 +1,37 @@
+import make_archives
+from scan_files import FileEntry
+
+
+def manifest(**ids):
+    return {"files": {f"wallpapers/{name}.jpg": {"size": 1, "mtime": 0, "id": fid} for name, fid in ids.items()}}
+
+
+def test_diff_manifests():
+    previous = manifest(kept="a", edited="b", gone="c")
+    current = manifest(kept="a", edited="B", new="d")
+    assert make_archives.diff_manifests(previous, current) == {
+        "added": ["wallpapers/new.jpg"],
+        "changed": ["wallpapers/edited.jpg"],
+        "removed": ["wallpapers/gone.jpg"],
+    }
+
+
+def test_diff_manifests_identical():
+    same = manifest(a="1", b="2")
+    assert make_archives.diff_manifests(same, same) == {"added": [], "changed": [], "removed": []}
+
+
+def test_build_manifest_reuses_ids(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "w").mkdir()
+    (tmp_path / "w" / "a.jpg").write_bytes(b"one")
+    fe = FileEntry("a.jpg", "w/a.jpg", 3, 100.0, "uncategorized")
+
+    first = make_archives.build_manifest("w.zip", [fe], {}, None)
+    assert first["files"]["w/a.jpg"]["id"] == make_archives.blob_id("w/a.jpg", 3)
+
+    # same size and mtime: the previous id is kept without hashing the file again
+    previous = {"files": {"w/a.jpg": {"size": 3, "mtime": 100.0, "id": "cached"}}}
+    assert make_archives.build_manifest("w.zip", [fe], {}, previous)["files"]["w/a.jpg"]["id"] == "cached"
+    # git blob ids win over both
+    assert make_archives.build_manifest("w.zip", [fe], {"w/a.jpg": "git"}, previous)["files"]["w/a.jpg"]["id"] == "git"
@@ -0,0 +1,99 @@
+import struct
+
+import pytest
+
+import probe_images
+from probe_images import ImageInfo
+
+
+def png_head(w, h):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+
+
+def jpeg_bytes(w, h, app1_len=16):
+    # SOI, one APPn segment of app1_len bytes (length field included), then SOF0
+    app1 = b"\xff\xe1" + struct.pack(">H", app1_len) + b"\x00" * (app1_len - 2)
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, h, w, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app1 + sof0 + b"\xff\xd9"
+
+
+def test_png_header():
+    assert probe_images._probe_png(png_head(1920, 1080)) == ImageInfo("PNG", 1920, 1080)
+    assert probe_images._probe_png(png_head(1920, 1080)[:20]) is None
+
+
+def test_gif_header():
+    assert probe_images._probe_gif(b"GIF89a" + struct.pack("<HH", 640, 480)) == ImageInfo("GIF", 640, 480)
+
+
+def test_bmp_header():
+    # BITMAPINFOHEADER with a negative (top-down) height
+    head = b"BM" + b"\x00" * 12 + struct.pack("<Iii", 40, 800, -600)
+    assert probe_images._probe_bmp(head) == ImageInfo("BMP", 800, 600)
+    # OS/2 BITMAPCOREHEADER stores 16-bit sizes
+    head = b"BM" + b"\x00" * 12 + struct.pack("<IHH", 12, 320, 200) + b"\x00" * 4
+    assert probe_images._probe_bmp(head) == ImageInfo("BMP", 320, 200)
+
+
+def test_webp_headers():
+    riff = b"RIFF\x00\x00\x00\x00WEBP"
+    lossy = riff + b"VP8 " + b"\x00" * 4 + b"\x00\x00\x00" + b"\x9d\x01\x2a" + struct.pack("<HH", 1280, 720)
+    assert probe_images._probe_webp(lossy) == ImageInfo("WEBP", 1280, 720)
+    bits = 1279 | (719 << 14)
+    lossless = riff + b"VP8L" + b"\x00" * 4 + b"\x2f" + struct.pack("<I", bits) + b"\x00" * 5
+    assert probe_images._probe_webp(lossless) == ImageInfo("WEBP", 1280, 720)
+    extended = riff + b"VP8X" + b"\x00" * 8 + (1279).to_bytes(3, "little") + (719).to_bytes(3, "little")
+    assert probe_images._probe_webp(extended) == ImageInfo("WEBP", 1280, 720)
+    assert probe_images._probe_webp(riff + b"VP8 " + b"\x00" * 14) is None
+
+
+def test_jpeg_header(tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(jpeg_bytes(1080, 1920))
+    assert probe_images.probe(str(path)) == ImageInfo("JPEG", 1080, 1920)
+
+
+def test_jpeg_frame_header_past_first_read(tmp_path):
+    # an APP1 (EXIF) segment larger than HEAD_BYTES pushes SOF0 out of the first read
+    path = tmp_path / "exif.jpg"
+    path.write_bytes(jpeg_bytes(4000, 3000, app1_len=probe_images.HEAD_BYTES - 100))
+    with open(path, "rb") as fh:
+        head = fh.read(probe_images.HEAD_BYTES)
+        assert probe_images._probe_jpeg(fh, head) == ImageInfo("JPEG", 4000, 3000)
+
+
+def test_jpeg_without_frame_header():
+    head = b"\xff\xd8" + b"\xff\xda" + b"\x00" * 16
+    assert probe_images._probe_jpeg(None, head) is None
+
+
+def test_probe_dispatches_on_magic_bytes(tmp_path):
+    # the extension does not matter, only the leading bytes do
+    path = tmp_path / "misnamed.jpg"
+    path.write_bytes(png_head(300, 200))
+    assert probe_images.probe(str(path)) == ImageInfo("PNG", 300, 200)
+
+
+def test_probe_unreadable(tmp_path):
+    assert probe_images.probe(str(tmp_path / "missing.png")) is None
+    path = tmp_path / "broken.svg"
+    path.write_text("<svg/>", encoding="utf-8")
+    assert probe_images.probe(str(path)) is None
+
+
+@pytest.mark.parametrize("fmt, options", [("PNG", {}), ("JPEG", {}), ("GIF", {}), ("BMP", {}),
+                                          ("WEBP", {"lossless": False}), ("WEBP", {"lossless": True})])
+def test_probe_matches_pillow(tmp_path, monkeypatch, fmt, options):
+    Image = pytest.importorskip("PIL.Image")
+    # the header parsers must answer on their own, without the Pillow fallback
+    monkeypatch.setattr(probe_images, "_probe_pillow", lambda path: None)
+    path = tmp_path / f"img.{fmt.lower()}"
+    Image.new("RGB", (123, 45), (200, 30, 30)).save(path, fmt, **options)
+    assert probe_images.probe(str(path)) == ImageInfo(fmt, 123, 45)
+
+
+def test_orientation_of():
+    assert probe_images.orientation_of(ImageInfo("PNG", 1920, 1080)) == "landscape"
+    assert probe_images.orientation_of(ImageInfo("PNG", 1080, 1920)) == "portrait"
+    assert probe_images.orientation_of(ImageInfo("PNG", 1000, 1050)) == ""
+    assert probe_images.orientation_of(None) == ""